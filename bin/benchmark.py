@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+"""Time each phase of McCole on synthetic books of increasing size."""
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Use this checkout of McCole and the generator next to this script.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import mccole  # noqa: E402
+from mccole import timing, util  # noqa: E402
+from mccole.builder import Builder  # noqa: E402
+from mccole.mccole import parse_args as mccole_args  # noqa: E402
+from synthbook import SIZES, make_book  # noqa: E402
+
+# Largest acceptable growth exponent (1.0 is linear).
+MAX_EXPONENT = 1.25
+
+# Phases faster than this (in seconds) are too noisy to fit.
+MIN_SECONDS = 0.01
+
+
+def main():
+    """Run benchmarks and save results."""
+    options = parse_args()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in options.sizes:
+            book = make_book(Path(tmp, f"book-{size}"), **_scaled(options, size))
+            results[size] = run_size(book, options.repeat)
+            _show(size, results[size])
+            shutil.rmtree(book)
+
+    exponents = growth_exponents(results)
+    report = {
+        "mccole": mccole.__version__,
+        "python": platform.python_version(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "repeat": options.repeat,
+        "results": {str(size): phases for (size, phases) in results.items()},
+        "exponents": exponents,
+    }
+    with open(options.output, "w") as writer:
+        json.dump(report, writer, indent=2)
+
+    failures = check_linear(exponents, options.max_exponent)
+    if options.compare:
+        failures += check_regressions(report, options.compare, options.tolerance)
+    for msg in failures:
+        print(msg, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+def parse_args():
+    """Handle command-line arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 20, 40, 80],
+        help="Numbers of chapters to try.",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size.")
+    parser.add_argument(
+        "--output", type=str, default="benchmark.json", help="Results file."
+    )
+    parser.add_argument(
+        "--compare", type=str, default=None, help="Earlier results to compare with."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown relative to earlier results.",
+    )
+    parser.add_argument(
+        "--max-exponent",
+        type=float,
+        default=MAX_EXPONENT,
+        help="Largest acceptable growth exponent.",
+    )
+    parser.add_argument(
+        "--scale",
+        type=str,
+        nargs="*",
+        default=["bib", "gloss", "links"],
+        help="Other sizes that grow with the number of chapters.",
+    )
+    return parser.parse_args()
+
+
+def run_size(book, repeat):
+    """Build a book several times, returning the best time for each phase."""
+    best = {}
+    original = os.getcwd()
+    os.chdir(book)
+    try:
+        for _ in range(repeat):
+            for (phase, seconds) in run_once().items():
+                best[phase] = min(seconds, best.get(phase, math.inf))
+    finally:
+        os.chdir(original)
+    return best
+
+
+def run_once():
+    """Build the book in the current directory once, timing each phase."""
+    util.DATA_CACHE.clear()
+
+    # Run the stages of a real build and use the phase times `--profile` records
+    # (without measuring memory, and without reporting or writing a trace file).
+    timing.TRACE_MEMORY = False
+    options = mccole_args(["-d", "_site", "--profile"])
+    builder = Builder(options)
+    start = time.perf_counter()
+    builder.load()
+    builder.parse()
+    builder.index()
+    builder.write()
+    total = time.perf_counter() - start
+
+    config = builder.state.config
+    timings = {
+        event["name"]: event["dur"] / 1e6
+        for event in config["profile"]
+        if event["cat"] == "phase"
+    }
+    timings["total"] = total
+    shutil.rmtree(config["dst"])
+    return timings
+
+
+def growth_exponents(results):
+    """Fit time ~ size**k for each phase by least squares in log-log space."""
+    sizes = sorted(results)
+    if len(sizes) < 2:
+        return {}
+    exponents = {}
+    for phase in results[sizes[0]]:
+        if results[sizes[-1]][phase] < MIN_SECONDS:
+            continue
+        points = [
+            (math.log(s), math.log(results[s][phase]))
+            for s in sizes
+            if results[s][phase] > 0
+        ]
+        if len(points) < 2:
+            continue
+        mean_x = sum(x for (x, _) in points) / len(points)
+        mean_y = sum(y for (_, y) in points) / len(points)
+        num = sum((x - mean_x) * (y - mean_y) for (x, y) in points)
+        den = sum((x - mean_x) ** 2 for (x, _) in points)
+        exponents[phase] = num / den
+    return exponents
+
+
+def check_linear(exponents, max_exponent):
+    """Complain about phases that grow faster than linearly."""
+    return [
+        f"{phase} grows as size^{k:.2f} (limit {max_exponent})"
+        for (phase, k) in sorted(exponents.items())
+        if k > max_exponent
+    ]
+
+
+def check_regressions(report, filename, tolerance):
+    """Complain about phases that are slower than in earlier results."""
+    with open(filename, "r") as reader:
+        previous = json.load(reader)
+    failures = []
+    for (size, phases) in report["results"].items():
+        for (phase, seconds) in phases.items():
+            before = previous["results"].get(size, {}).get(phase, None)
+            if (before is None) or (seconds < MIN_SECONDS):
+                continue
+            if seconds > before * (1 + tolerance):
+                failures.append(
+                    f"{phase} at size {size}: {seconds:.3f}s vs. {before:.3f}s "
+                    f"in {previous['mccole']}"
+                )
+    return failures
+
+
+# ----------------------------------------------------------------------
+
+
+def _scaled(options, size):
+    """Scale sizes of a synthetic book with its number of chapters."""
+    ratio = size / SIZES["chapters"]
+    result = {key: max(1, int(SIZES[key] * ratio)) for key in options.scale}
+    result["chapters"] = size
+    return result
+
+
+def _show(size, phases):
+    """Display results for one size."""
+    print(f"chapters: {size}")
+    for (phase, seconds) in phases.items():
+        print(f"  {phase:20} {1000 * seconds:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
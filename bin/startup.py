@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""Time McCole's startup and an incremental build with nothing to do."""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Use this checkout of McCole and the generator next to this script.
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthbook import make_book  # noqa: E402
+
+# Largest acceptable overhead (in milliseconds) on top of starting Python.
+LIMIT = 100
+
+
+def main():
+    """Run timings and report them."""
+    options = parse_args()
+    env = os.environ | {"PYTHONPATH": str(ROOT)}
+    env.pop("MCCOLE_SOCKET", None)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        src = Path(tmp_dir, "src")
+        dst = Path(tmp_dir, "dst")
+        make_book(src)
+        build = [sys.executable, "-m", "mccole", "-C", str(src), "-d", str(dst), "-i"]
+        subprocess.run(build, env=env, check=True, capture_output=True)
+
+        commands = {
+            "python": [sys.executable, "-c", "pass"],
+            "help": [sys.executable, "-m", "mccole", "--help"],
+            "no-op": build,
+        }
+        times = {
+            name: time_command(command, env, options.repeat)
+            for (name, command) in commands.items()
+        }
+
+    base = min(times["python"])
+    failures = []
+    print(f"{'command':<8} {'min':>8} {'median':>8} {'overhead':>9}")
+    for (name, values) in times.items():
+        overhead = min(values) - base
+        print(
+            f"{name:<8} {min(values):>6.1f}ms {statistics.median(values):>6.1f}ms "
+            f"{overhead:>7.1f}ms"
+        )
+        if overhead > options.limit:
+            failures.append(f"{name} takes {overhead:.1f} ms more than Python itself")
+
+    for msg in failures:
+        print(msg, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+def parse_args():
+    """Handle command-line arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per command.")
+    parser.add_argument(
+        "--limit",
+        type=float,
+        default=LIMIT,
+        help="Largest acceptable overhead in milliseconds.",
+    )
+    return parser.parse_args()
+
+
+def time_command(command, env, repeat):
+    """Run a command several times, returning wall-clock times in milliseconds."""
+    result = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, capture_output=True)
+        result.append(1000 * (time.perf_counter() - start))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+
+"""Generate a synthetic McCole project for benchmarking."""
+
+import argparse
+import random
+from pathlib import Path
+
+import yaml
+
+# Default size of each part of a synthetic book.
+SIZES = {
+    "chapters": 10,
+    "headings": 5,
+    "figures": 3,
+    "tables": 2,
+    "citations": 5,
+    "terms": 5,
+    "inclusions": 3,
+    "assets": 3,
+    "paragraphs": 10,
+    "bib": 200,
+    "gloss": 200,
+    "links": 200,
+}
+
+WORDS = """
+alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi
+omicron pi rho sigma tau upsilon phi chi psi omega
+""".split()
+
+TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+  <head>
+    <meta charset="UTF-8">
+    <title>{site.title}</title>
+    <link href="{page.to_root}/static/book.css" rel="stylesheet" type="text/css">
+  </head>
+  <body>
+    <main>
+      {page.content}
+      <footer>
+        {site.author} &middot; {site.copyrightyear} &middot; {site.builddate}
+      </footer>
+    </main>
+  </body>
+</html>
+"""
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="200" height="100">
+<rect x="{x}" y="{y}" width="50" height="25" fill="none" stroke="black"/>
+</svg>
+"""
+
+
+def main():
+    """Generate a project in the directory given on the command line."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dst", type=str, help="Where to create project.")
+    parser.add_argument("--seed", type=int, default=12345, help="Random seed.")
+    for (key, value) in SIZES.items():
+        parser.add_argument(
+            f"--{key}", type=int, default=value, help=f"Number of {key}."
+        )
+    options = parser.parse_args()
+    sizes = {key: getattr(options, key) for key in SIZES}
+    make_book(options.dst, seed=options.seed, **sizes)
+
+
+def make_book(dst, seed=12345, **sizes):
+    """Create a synthetic project in `dst` shaped like `sample/`."""
+    sizes = SIZES | sizes
+    rand = random.Random(seed)
+    root = Path(dst)
+    root.mkdir(parents=True, exist_ok=True)
+
+    slugs = [f"ch{i:04d}" for i in range(1, sizes["chapters"] + 1)]
+    bib_keys = [f"Author{i:05d}" for i in range(sizes["bib"])]
+    gloss_keys = [f"term_{i:05d}" for i in range(sizes["gloss"])]
+    link_keys = [f"link-{i:05d}" for i in range(sizes["links"])]
+
+    _make_config(root, slugs)
+    _make_templates(root)
+    _make_data(root, rand, bib_keys, gloss_keys, link_keys)
+    _make_static(root, sizes)
+    _write(
+        root / "index.md",
+        '---\ntemplate: index.html\n---\n\n<div class="toc" level="1" />\n',
+    )
+    for (i, slug) in enumerate(slugs):
+        _make_chapter(root, rand, slugs, i, sizes, bib_keys, gloss_keys, link_keys)
+    _write(
+        root / "bibliography" / "index.md",
+        "---\ntemplate: page.html\n---\n\n# Bibliography {#bibliography}\n\n"
+        '<div class="bibliography" />\n',
+    )
+    _write(
+        root / "glossary" / "index.md",
+        "---\ntemplate: page.html\n---\n\n# Glossary {#glossary}\n\n"
+        '<div class="glossary" />\n',
+    )
+    return root
+
+
+# ----------------------------------------------------------------------
+
+
+def _make_chapter(root, rand, slugs, i, sizes, bib_keys, gloss_keys, link_keys):
+    """Create a single chapter with inclusions and figures."""
+    slug = slugs[i]
+    chapter = root / slug
+    figures = [f"{slug}-fig-{j}" for j in range(sizes["figures"])]
+    tables = [f"{slug}-tbl-{j}" for j in range(sizes["tables"])]
+    headings = [f"{slug}-sec-{j}" for j in range(sizes["headings"])]
+
+    # Things to sprinkle through the text.
+    extras = []
+    extras += [
+        f'<figure id="{fig}">\n'
+        f'  <img src="figures/{fig}.svg" alt="Figure {fig}" />\n'
+        f"  <figcaption>Caption for {fig}.</figcaption>\n</figure>"
+        for fig in figures
+    ]
+    extras += [
+        f'<div class="table" id="{tbl}" cap="Caption for {tbl}.">\n'
+        "| Left | Right |\n| ---- | ----- |\n"
+        + "\n".join(f"| {_words(rand, 2)} | {_words(rand, 2)} |" for _ in range(5))
+        + "\n</div>"
+        for tbl in tables
+    ]
+    for _ in range(sizes["citations"]):
+        cited = ",".join(rand.sample(bib_keys, min(2, len(bib_keys))))
+        extras.append(f"{_paragraph(rand)} See <cite>{cited}</cite>.")
+    extras += [
+        f'The term <span g="{rand.choice(gloss_keys)}">{_words(rand, 2)}</span> '
+        f'and <span i="{_words(rand, 1)}">indexed text</span> '
+        f"with a [link][{rand.choice(link_keys)}]."
+        for _ in range(sizes["terms"])
+    ]
+    for j in range(sizes["inclusions"]):
+        name = f"code-{j}.py"
+        _write(chapter / name, _code(rand, j))
+        extras.append(f'<div class="include" file="{name}" keep="part" />')
+        extras.append(f'<div class="include" file="{name}" erase="part" />')
+    extras += [f'Compare <a figure="{rand.choice(figures)}"/>.' for _ in figures]
+    extras += [f'Compare <a table="{rand.choice(tables)}"/>.' for _ in tables]
+    extras.append(f'Also see <a section="{rand.choice(slugs)}"/>.')
+    rand.shuffle(extras)
+
+    # Spread paragraphs and extras across headings.
+    body = []
+    per_heading = max(1, (sizes["paragraphs"] + len(extras)) // max(1, len(headings)))
+    items = [_paragraph(rand) for _ in range(sizes["paragraphs"])] + extras
+    for (k, heading) in enumerate(headings):
+        body.append(f"## Section {k + 1} {{#{heading}}}")
+        body.extend(items[k * per_heading : (k + 1) * per_heading])  # noqa e203
+    body.extend(items[len(headings) * per_heading :])  # noqa e203
+
+    text = "\n\n".join(
+        [
+            "---\ntemplate: page.html\n---",
+            f"# Chapter {i + 1} {{#{slug}}}",
+            '<div class="toc" level="2" />',
+            *body,
+        ]
+    )
+    _write(chapter / "index.md", text + "\n")
+
+    for (j, fig) in enumerate(figures):
+        svg = SVG.format(x=j, y=i % 50)
+        _write(chapter / "figures" / f"{fig}.svg", svg)
+        _write(chapter / "figures" / f"{fig}.pdf", svg * 20)
+
+
+def _make_config(root, slugs):
+    """Create configuration file."""
+    config = {
+        "copyrightyear": 2022,
+        "author": "Synthetic Author",
+        "repo": "https://example.org/synthetic",
+        "tool": "McCole",
+        "src": ".",
+        "dst": "_site",
+        "links": "_data/links.yml",
+        "bib": "_data/bibliography.bib",
+        "gloss": "_data/glossary.yml",
+        "lang": "en",
+        "copy": ["*/figures/*.svg", "*/figures/*.pdf", "static/*.*"],
+        "root": "index.md",
+        "chapters": [{"slug": s} for s in slugs]
+        + [{"slug": "bibliography", "appendix": True}, {"slug": "glossary"}],
+    }
+    _write(root / "mccole.yml", yaml.safe_dump(config, sort_keys=False))
+
+
+def _make_data(root, rand, bib_keys, gloss_keys, link_keys):
+    """Create bibliography, glossary, and links files."""
+    entries = []
+    for (i, key) in enumerate(bib_keys):
+        kind = ("book", "inproceedings", "misc")[i % 3]
+        fields = {
+            "author": " and ".join(_words(rand, 2).title() for _ in range(2)),
+            "title": _words(rand, 5).capitalize(),
+            "year": str(1990 + i % 30),
+        }
+        if kind == "book":
+            fields |= {"publisher": "Synthetic Press", "isbn": f"978-{i:010d}"}
+        elif kind == "inproceedings":
+            fields |= {
+                "booktitle": f"Proc. {_words(rand, 2).title()}",
+                "doi": f"10.0000/{i}",
+            }
+        else:
+            fields |= {"url": f"https://example.org/{key}"}
+        body = ",\n".join(f"  {k} = {{{v}}}" for (k, v) in fields.items())
+        entries.append(f"@{kind}{{{key},\n{body},\n}}\n")
+    _write(root / "_data" / "bibliography.bib", "\n".join(entries))
+
+    glossary = [
+        {
+            "key": key,
+            "en": {
+                "term": _words(rand, 2),
+                "def": f"{_paragraph(rand)} See [this](#{rand.choice(gloss_keys)}).",
+            },
+        }
+        for key in gloss_keys
+    ]
+    _write(root / "_data" / "glossary.yml", yaml.safe_dump(glossary, sort_keys=False))
+
+    links = [
+        {"key": key, "url": f"https://example.org/{key}", "title": _words(rand, 3)}
+        for key in link_keys
+    ]
+    _write(root / "_data" / "links.yml", yaml.safe_dump(links, sort_keys=False))
+
+
+def _make_static(root, sizes):
+    """Create static assets."""
+    _write(root / "static" / "book.css", "body { font-family: serif; }\n")
+    for i in range(sizes["assets"]):
+        _write(root / "static" / f"asset-{i}.txt", f"asset {i}\n" * 1000)
+
+
+def _make_templates(root):
+    """Create page templates."""
+    _write(root / "_template" / "page.html", TEMPLATE)
+    _write(root / "_template" / "index.html", TEMPLATE)
+
+
+def _code(rand, j):
+    """Create an inclusion file with a marked section."""
+    before = "\n".join(f"x{k} = {k}" for k in range(5))
+    part = "\n".join(f"print('{_words(rand, 3)}')" for _ in range(10))
+    return f"{before}\n# [part]\n{part}\n# [/part]\nprint({j})\n"
+
+
+def _paragraph(rand):
+    """Create a paragraph of random words."""
+    lines = [_words(rand, 10) for _ in range(rand.randint(3, 6))]
+    return "\n".join(lines).capitalize() + "."
+
+
+def _words(rand, num):
+    """Create a string of random words."""
+    return " ".join(rand.choice(WORDS) for _ in range(num))
+
+
+def _write(path, text):
+    """Write a file, creating directories as needed."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
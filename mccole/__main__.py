@@ -2,10 +2,17 @@
 
 import sys
 
-from .mccole import main
-from .util import McColeExc
+from .daemon import forward
 
 if __name__ == "__main__":
+    # Let a running daemon do the build if there is one.
+    status = forward(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
+    from .mccole import main
+    from .util import McColeExc
+
     try:
         main(sys.argv[1:])
     except McColeExc as exc:
@@ -1,35 +1,121 @@
 """Handle bibliography."""
 
+import json
+import os
 import re
 
-import bibtexparser
+from .cache import cache_fragment, cache_load
+from .util import McColeExc, err, load_yaml
 
 
 def bib_keys(config):
     """Return all citation keys."""
     if "bib_data" not in config:
         return set()
-    return {entry["ID"] for entry in config["bib_data"]}
+    return config["bib_data"].keys()
 
 
 def bib_to_html(config):
-    """Create HTML version of bibliography data."""
-    entries = [_bib_to_html(e) for e in config["bib_data"]]
-    return "\n".join(['<div class="bibliography">', "\n".join(entries), "</div>"])
+    """Create HTML version of bibliography data (only cited entries if asked)."""
+    entries = list(config["bib_data"].values())
+    if config.get("cited_only", False):
+        cited = config["cited"]
+        entries = [e for e in entries if e["ID"] in cited]
+    return cache_fragment(config, "bib", entries, lambda: _entries_to_html(entries))
+
+
+def collect_citations(config):
+    """Find and check every page's citations before any page is rendered."""
+    known = bib_keys(config)
+    cited = set()
+    for info in config["pages"]:
+        for token in info["tokens"]:
+            for child in token.children or []:
+                if child.type != "mccole_cite":
+                    continue
+                for key in child.meta["keys"]:
+                    if key not in known:
+                        err(config, f"Unknown citation key {key} ({info['src']}).")
+                    cited.add(key)
+    config["cited"] = cited
 
 
 def load_bib(config):
-    """Read bibliography file if there is one."""
-    if "bib" in config:
-        with open(config["bib"], "r") as reader:
-            config["bib_data"] = bibtexparser.load(reader).entries
-    else:
-        config["bib_data"] = {}
+    """Read bibliography file if there is one, indexing entries by key."""
+    config["bib_data"] = {}
+    if "bib" not in config:
+        return
+    for entry in cache_load(config, config["bib"], _read_bib):
+        if entry["ID"] in config["bib_data"]:
+            err(config, f"Duplicate bibliography key {entry['ID']}.")
+        config["bib_data"][entry["ID"]] = entry
 
 
 # ----------------------------------------------------------------------
 
 
+def _entries_to_html(entries):
+    """Format bibliography entries."""
+    entries = [_bib_to_html(e) for e in entries]
+    return "\n".join(['<div class="bibliography">', "\n".join(entries), "</div>"])
+
+
+def _read_bib(filename):
+    """Parse a bibliography file in whatever format it is in."""
+    suffix = os.path.splitext(filename)[1].lower()
+    if suffix not in READERS:
+        raise McColeExc(f"Unknown bibliography format {filename}.")
+    with open(filename, "r") as reader:
+        return READERS[suffix](reader)
+
+
+def _read_bibtex(reader):
+    """Parse a BibTeX file."""
+    # Imported here because it is slow to load and only needed for BibTeX.
+    import bibtexparser
+
+    return bibtexparser.load(reader).entries
+
+
+def _read_json(reader):
+    """Parse a JSON bibliography."""
+    return [_normalize(entry) for entry in json.load(reader)]
+
+
+def _read_yaml(reader):
+    """Parse a YAML bibliography."""
+    return [_normalize(entry) for entry in load_yaml(reader) or []]
+
+
+def _normalize(entry):
+    """Convert a YAML/JSON entry to the form that `bibtexparser` produces."""
+    result = {
+        "ENTRYTYPE": KINDS.get(entry["kind"], entry["kind"]),
+        "ID": entry["key"],
+    }
+    for (field, value) in entry.items():
+        if field in {"key", "kind"}:
+            continue
+        if isinstance(value, list):
+            value = " and ".join(str(v) for v in value)
+        result[field] = str(value)
+    return result
+
+
+# Readers for each bibliography format.
+READERS = {
+    ".bib": _read_bibtex,
+    ".json": _read_json,
+    ".yaml": _read_yaml,
+    ".yml": _read_yaml,
+}
+
+# Translate YAML/JSON entry kinds to BibTeX entry types.
+KINDS = {
+    "link": "misc",
+}
+
+
 def _bib_to_html(entry):
     """Convert bibliography entry to HTML."""
     kind = entry["ENTRYTYPE"]
@@ -207,12 +293,12 @@ def _url(entry, prefix=None):
     return _with_prefix(f'<a href="{url}">{url}</a>', prefix)
 
 
-def _vol_num(entry):
+def _vol_num(entry, prefix=None):
     if "volume" not in entry:
         return None
     if "number" not in entry:
-        return entry["volume"]
-    return f"{entry['volume']}({entry['number']})"
+        return _with_prefix(entry["volume"], prefix)
+    return _with_prefix(f"{entry['volume']}({entry['number']})", prefix)
 
 
 def _with_prefix(text, prefix):
@@ -0,0 +1,255 @@
+"""Build sites in explicit stages, re-using parsers and data between builds."""
+
+import logging
+import os
+import shutil
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .bib import bib_keys, collect_citations, load_bib
+from .cache import report_cache
+from .config import get_config, load_templates
+from .crossref import cross_reference
+from .gloss import gloss_keys, load_gloss
+from .incremental import check_fresh, save_manifest
+from .outputs import report_outputs, save_outputs
+from .read import collect_pages
+from .timing import report_timing, start_timing, timed
+from .tokenize import tokenize
+from .util import LOGGER_NAME, McColeExc, pretty
+from .write import copy_files, generate_pages, report_copies
+
+# Stages of a build in the order they must be run.
+STAGES = ("new", "loaded", "parsed", "indexed", "written", "reported")
+
+# Where to report.
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+@dataclass
+class BuildState:
+    """What a build has produced so far."""
+
+    stage: str = "new"
+    config: Optional[dict] = None
+    xref: Optional[dict] = None
+    seen: Optional[dict] = None
+
+    @property
+    def pages(self) -> list:
+        """Information about each page (empty until parsed)."""
+        return self.config.get("pages", []) if self.config else []
+
+    @property
+    def errors(self) -> list:
+        """Error messages recorded so far."""
+        return self.config.get("error_log", []) if self.config else []
+
+
+@dataclass
+class Session:
+    """Parsed pages shared by many builds in one process."""
+
+    # Parsers and data files are already re-used by every build in a process
+    # (see `get_md` and `load_cached`): this adds each project's token streams.
+    memos: dict = field(default_factory=dict)
+
+    def build(self, options):
+        """Do a complete build, returning its final state."""
+        return Builder(options, self).build()
+
+    def memo(self, options, config):
+        """Get the remembered token streams for a project."""
+        key = (os.path.abspath(options.config), os.path.abspath(config["src"]))
+        return self.memos.setdefault(key, {})
+
+
+class Builder:
+    """Run the stages of a single build in order, keeping results in `state`."""
+
+    def __init__(self, options, session=None):
+        """Start a build with command-line options (see `mccole.parse_args`)."""
+        self.options = options
+        self.session = session if session is not None else Session()
+        self.state = BuildState()
+
+    def build(self):
+        """Run every stage, returning the final state."""
+        self.load()
+        self.parse()
+        self.index()
+        self.write()
+        self.report()
+        return self.state
+
+    def load(self):
+        """Read the configuration file, data files, and templates."""
+        self._advance("loaded")
+        options = self.options
+        config = get_config(options)
+        LOGGER.info(f"configuration is {pretty(config)}")
+        start_timing(options, config)
+
+        with timed(config, "load_bib"):
+            load_bib(config)
+        with timed(config, "load_gloss"):
+            load_gloss(config)
+        with timed(config, "load_templates"):
+            load_templates(config)
+        self.state.config = config
+
+    def parse(self):
+        """Find pages and turn them into tokens (re-using unchanged pages)."""
+        self._advance("parsed")
+        config = self.state.config
+        with timed(config, "collect_pages"):
+            config["pages"] = collect_pages(config)
+        LOGGER.info(f"pages are {pretty(config['pages'])}")
+
+        memo = self.session.memo(self.options, config)
+        with timed(config, "tokenize"):
+            tokenize(config, self.options.jobs, memo)
+
+    def index(self):
+        """Number headings, figures, and tables and check citations."""
+        self._advance("indexed")
+        config = self.state.config
+        with timed(config, "cross_reference"):
+            self.state.xref = cross_reference(config)
+        with timed(config, "collect_citations"):
+            collect_citations(config)
+        LOGGER.info(f"xref is {pretty(self.state.xref)}")
+
+    def write(self):
+        """Generate pages and copy files to the output directory."""
+        self._advance("written")
+        options, config, xref = self.options, self.state.config, self.state.xref
+        with timed(config, "clean_output"):
+            _clean_output(options, config)
+        with timed(config, "check_fresh"):
+            check_fresh(options, config, xref)
+        with timed(config, "generate_pages"):
+            self.state.seen = generate_pages(config, xref, options.jobs)
+        with timed(config, "copy_files"):
+            copy_files(config, _sync_mode(options), options.link)
+        with timed(config, "prune_output"):
+            _prune_output(options, config)
+        with timed(config, "save_outputs"):
+            save_outputs(options, config)
+        with timed(config, "save_manifest"):
+            save_manifest(options, config, xref)
+
+    def report(self):
+        """Print errors and whatever reports were asked for."""
+        self._advance("reported")
+        options, config = self.options, self.state.config
+        _warn_unused(options, config, self.state.xref, self.state.seen)
+        _report_links(options, config)
+        _report_errors(config)
+        report_cache(options, config)
+        report_copies(options, config)
+        report_outputs(options, config)
+        report_timing(options, config)
+
+    def _advance(self, stage):
+        """Move to the next stage, complaining if a stage is skipped or repeated."""
+        expected = STAGES[STAGES.index(stage) - 1]
+        if self.state.stage != expected:
+            raise McColeExc(
+                f"Cannot move build to stage '{stage}' from '{self.state.stage}'."
+            )
+        self.state.stage = stage
+
+
+# ----------------------------------------------------------------------
+
+
+def _clean_output(options, config):
+    """Delete output directory unless told not to."""
+    if options.keep or options.incremental or options.prune or options.sync:
+        return
+    if not os.path.exists(config["dst"]):
+        return
+
+    # Keep the record of outputs so that the next one can be compared with it.
+    if not options.manifest:
+        shutil.rmtree(config["dst"])
+        return
+    for entry in os.scandir(config["dst"]):
+        if entry.name == ".mccole":
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.unlink(entry.path)
+
+
+def _prune_output(options, config):
+    """Delete output files this build didn't produce and empty directories."""
+    if not options.prune:
+        return
+
+    produced = {os.path.normpath(info["dst"]) for info in config["pages"]}
+    produced |= {os.path.normpath(dst) for dst in config["copied"]}
+    internal = os.path.normpath(os.path.join(config["dst"], ".mccole"))
+
+    for (dirpath, _, filenames) in os.walk(config["dst"], topdown=False):
+        dirpath = os.path.normpath(dirpath)
+        if (dirpath == internal) or dirpath.startswith(internal + os.sep):
+            continue
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if path not in produced:
+                LOGGER.info(f"pruning {path}")
+                os.unlink(path)
+        if (dirpath != os.path.normpath(config["dst"])) and not os.listdir(dirpath):
+            LOGGER.info(f"pruning {dirpath}")
+            os.rmdir(dirpath)
+
+
+def _report_errors(config):
+    """Report any errors found."""
+    if "error_log" in config:
+        for msg in config["error_log"]:
+            print(msg)
+
+
+def _report_links(options, config):
+    """Report which links each page uses if asked to."""
+    if not options.links_used:
+        return
+    for info in config["pages"]:
+        used = "\n- ".join(sorted(info["links_used"])) or "(none)"
+        print(f"Links used by {info['slug']}:\n- {used}")
+
+
+def _sync_mode(options):
+    """Decide how to sync copied files (incremental builds always sync)."""
+    if options.sync:
+        return options.sync
+    return "mtime" if options.incremental else None
+
+
+def _warn_unused(options, config, xref, seen):
+    """Warn about unused labels if asked to."""
+    if not options.unused:
+        return
+
+    _warn_unused_title("citation", bib_keys(config) - seen["cite"])
+    _warn_unused_title("glossary", gloss_keys(config) - seen["gloss_ref"])
+
+    for (title, defined_key, used_key) in (
+        ("figure", "fig", "figure_ref"),
+        ("table", "tbl", "table_ref"),
+    ):
+        defined = set(xref[defined_key].keys())
+        used = seen[used_key]
+        _warn_unused_title(title, defined - used)
+
+
+def _warn_unused_title(title, items):
+    """Warn about a single set of missing items (if any)."""
+    if not items:
+        return
+    unused = "\n- ".join(sorted(items))
+    print(f"Unreferenced {title}:\n- {unused}")
@@ -0,0 +1,111 @@
+"""Persistent cache of data derived from inputs."""
+
+import logging
+import marshal
+import os
+import sys
+from pathlib import Path
+
+from . import __version__
+from .util import LOGGER_NAME, hash_data, hash_file, load_cached
+
+# Change this when the format of cached data changes.
+CACHE_VERSION = 2
+
+# Where to report.
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+def cache_fragment(config, kind, inputs, make):
+    """Get generated HTML from the cache, making and caching it if necessary."""
+    if not config.get("cache", None):
+        return make()
+
+    key = hash_data([__version__, config.get("lang", None), inputs])
+    html = cache_get(config, kind, key)
+    if html is None:
+        html = make()
+        cache_put(config, kind, key, html)
+    return html
+
+
+def cache_get(config, kind, key):
+    """Get cached data, or None if caching is off or the data isn't there."""
+    if not config.get("cache", None):
+        return None
+
+    try:
+        data = marshal.loads(_cache_path(config, kind, key).read_bytes())
+    except (OSError, EOFError, ValueError, TypeError):
+        data = None
+
+    _count(config, kind, "misses" if data is None else "hits")
+    return data
+
+
+def cache_put(config, kind, key, data):
+    """Save data in the cache (if caching is on)."""
+    if not config.get("cache", None):
+        return
+
+    try:
+        content = marshal.dumps(data)
+    except ValueError as exc:
+        LOGGER.debug(f"cannot cache {kind} {key}: {exc}")
+        return
+
+    path = _cache_path(config, kind, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(f".{os.getpid()}.tmp")
+    temp.write_bytes(content)
+    os.replace(temp, path)
+
+
+def cache_load(config, filename, loader):
+    """Load a data file, re-using parsed data from memory or the cache."""
+    return load_cached(filename, lambda f: _load_via_cache(config, f, loader))
+
+
+def merge_cache_stats(config, stats):
+    """Add cache hits and misses counted elsewhere (e.g., in a worker process)."""
+    for (kind, counts) in stats.items():
+        for (outcome, num) in counts.items():
+            _count(config, kind, outcome, num)
+
+
+def report_cache(options, config):
+    """Report cache hits and misses if asked to."""
+    if not options.cache_stats:
+        return
+    if not config.get("cache", None):
+        print("Caching is off.")
+        return
+    for (kind, counts) in sorted(config.get("cache_stats", {}).items()):
+        print(f"Cache {kind}: {counts['hits']} hits, {counts['misses']} misses.")
+
+
+# ----------------------------------------------------------------------
+
+
+def _cache_path(config, kind, key):
+    """Construct path to cached data."""
+    # Marshalled data is only readable by the same version of Python.
+    version = f"v{CACHE_VERSION}-{sys.implementation.cache_tag}"
+    return Path(config["cache"], version, kind, f"{key}.bin")
+
+
+def _count(config, kind, outcome, num=1):
+    """Count cache hits or misses."""
+    stats = config.setdefault("cache_stats", {})
+    counts = stats.setdefault(kind, {"hits": 0, "misses": 0})
+    counts[outcome] += num
+
+
+def _load_via_cache(config, filename, loader):
+    """Load a data file from the cache, parsing and caching it if necessary."""
+    key = hash_data([hash_file(filename), f"{loader.__module__}.{loader.__name__}"])
+    data = cache_get(config, "data", key)
+    if data is None:
+        data = loader(filename)
+        cache_put(config, "data", key, data)
+    return data
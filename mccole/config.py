@@ -3,9 +3,8 @@
 import os
 from glob import glob
 
-import yaml
-
-from .util import McColeExc
+from .cache import cache_load
+from .util import McColeExc, load_yaml
 
 # Main filename for each chapter.
 MAIN_SRC_FILE = "index.md"
@@ -26,13 +25,19 @@ def get_config(options):
     """Read configuration file."""
     try:
         with open(options.config, "r") as reader:
-            config = yaml.safe_load(reader) or {}
+            config = load_yaml(reader) or {}
             config = DEFAULTS | config
 
+            if getattr(options, "cache", None):
+                config["cache"] = options.cache
+            if getattr(options, "cited_only", False):
+                config["cited_only"] = True
+            if getattr(options, "reproducible", False):
+                config["reproducible"] = True
             if "dst" in options:
                 config["dst"] = options.dst
             if "links" in config:
-                config["links"] = _read_links(config["links"])
+                config["links_data"] = cache_load(config, config["links"], _read_links)
             if "src" in options:
                 config["src"] = options.src
 
@@ -54,4 +59,4 @@ def load_templates(config):
 def _read_links(filename):
     """Read YAML links file for later use."""
     with open(filename, "r") as reader:
-        return yaml.safe_load(reader)
+        return load_yaml(reader)
@@ -1,124 +1,50 @@
 """Create cross-reference lookup."""
 
 import logging
+from collections import namedtuple
 
-from .patterns import (
-    FIGURE,
-    FIGURE_ALT,
-    FIGURE_CAP,
-    FIGURE_SRC,
-    HEADING_ID,
-    TABLE_ID,
-    TABLE_START,
-)
 from .util import LOGGER_NAME, McColeExc, err
 
 # Where to report.
 LOGGER = logging.getLogger(LOGGER_NAME)
 
+# What a cross-reference resolves to: `label` is ready to display
+# (e.g., "Figure&nbsp;2.1") and `href` is relative to the site root.
+Ref = namedtuple("Ref", ["label", "slug", "href", "title"])
+
+# A heading in a chapter's outline (`children` are sub-headings).
+Heading = namedtuple("Heading", ["key", "title", "children"])
+
 
 def cross_reference(config):
-    """Create cross-reference tables for all pages."""
+    """Create cross-reference tables for all pages in a single pass."""
     # Exclude un-indexed pages (e.g., home page).
     pages = [p for p in config["pages"] if p["major"] is not None]
-    
-    xref = {}
-    _headings(config, xref, pages)
-    _figures(config, xref, pages)
-    _tables(config, xref, pages)
-
-    return xref
-
-
-# ----------------------------------------------------------------------
-
-
-def _figures(config, xref, pages):
-    """Build cross-references for figures."""
-    fig_id_to_index = {}
-    fig_id_to_slug = {}
-    xref |= {
-        "fig_id_to_index": fig_id_to_index,
-        "fig_id_to_slug": fig_id_to_slug
-    }
 
+    xref = {"fig": {}, "hd": {}, "outline": {}, "tbl": {}}
     for info in pages:
-        current = [info["major"], 0]
-
-        for token in info["tokens"]:
-            if token.type != "html_block":
-                continue
+        _index_page(config, xref, info)
 
-            match = FIGURE.search(token.content)
-            if not match:
-                continue
-
-            fig_id = match.group(1)
-            src = FIGURE_SRC.search(match.group(0))
-            alt = FIGURE_ALT.search(match.group(0))
-            caption = FIGURE_CAP.search(match.group(0))
-            if not all([fig_id, src, alt, caption]):
-                err(config, "Badly-formatted figure ({info['src']}/{token.map[1]}).")
-
-            if fig_id in fig_id_to_index:
-                err(
-                    config,
-                    "Duplicate figure ID {fig_id} ({info['src']}/{token.map[1]}).",
-                )
-
-            current[1] += 1
-            label = tuple(current)
-            fig_id_to_index[fig_id] = label
-            fig_id_to_slug[fig_id] = info["slug"]
-
-
-def _headings(config, xref, pages):
-    """Compile headings."""
-    hd_id_to_index = {}
-    hd_id_to_title = {}
-    hd_id_to_slug = {}
-    hd_index_to_id = {}
-    xref |= {
-        "hd_id_to_index": hd_id_to_index,
-        "hd_id_to_title": hd_id_to_title,
-        "hd_id_to_slug": hd_id_to_slug,
-        "hd_index_to_id": hd_index_to_id,
-    }
-
-    for info in pages:
-        label_stack = [info["major"]]
-        info["major"] = str(info["major"])
-        previous = None
-        for token in info["tokens"]:
-            if (previous is None) or (previous.type != "heading_open"):
-                previous = token
-                continue
+    return xref
 
-            if token.type != "inline":
-                raise McColeExc(
-                    f"Unexpected token type {token.type} for heading{_line(token)}."
-                )
 
-            title, label = _heading_info(token)
-            if not label:
-                previous = token
-                continue
+# ----------------------------------------------------------------------
 
-            level = _heading_level(previous)
-            index = _heading_index(config, info["src"], token, label_stack, level)
 
-            if (label in hd_id_to_index) or (label in hd_id_to_title):
-                err(
-                    config,
-                    f"Duplicate heading label {label} ({info['src']}/{_line(token)}).",
-                )
+def _add(config, info, token, table, key, ref, kind):
+    """Add a reference to a table, complaining about duplicates."""
+    if key in table:
+        err(config, f"Duplicate {kind} ID {key} ({info['src']}/{_line(token)}).")
+    table[key] = ref
 
-            hd_id_to_index[label] = index
-            hd_id_to_title[label] = title
-            hd_id_to_slug[label] = info["slug"]
-            hd_index_to_id[index] = label
 
-            previous = token
+def _choose_heading_term(index):
+    """Choose 'Chapter', 'Section', or 'Appendix'."""
+    if len(index) > 1:
+        return "Section"
+    if index[0].isdigit():
+        return "Chapter"
+    return "Appendix"
 
 
 def _heading_index(config, filename, token, stack, level):
@@ -150,11 +76,10 @@ def _heading_index(config, filename, token, stack, level):
 
 def _heading_info(token):
     """Get title and label (or None) from token."""
-    assert token.type == "inline"
-    match = HEADING_ID.search(token.content)
-    if not match:
+    assert token.type == "heading_open"
+    if not token.meta:
         return None, None
-    return match.group(1), match.group(3)
+    return token.meta["title"], token.meta["id"]
 
 
 def _heading_level(token):
@@ -169,42 +94,64 @@ def _heading_level(token):
     return level
 
 
-def _line(token):
-    """Return line number message or empty string."""
-    if (token is None) or (token.map is None):
-        return f" ({str(token)})"
-    return f" (line {token.map[1]})"
-
+def _index_page(config, xref, info):
+    """Index the headings, figures, and tables of one page."""
+    slug = info["slug"]
+    label_stack = [info["major"]]
+    info["major"] = str(info["major"])
+    counts = {"fig": 0, "tbl": 0}
 
-def _tables(config, xref, pages):
-    """Build cross-references for tables."""
-    tbl_id_to_index = {}
-    tbl_id_to_slug = {}
-    xref |= {
-        "tbl_id_to_index": tbl_id_to_index,
-        "tbl_id_to_slug": tbl_id_to_slug
-    }
+    # Headings nest inside the most recent heading of a higher level.
+    outline = Heading(slug, None, [])
+    parents = [(1, outline)]
+    xref["outline"][slug] = outline.children
 
-    for info in pages:
-        current = [info["major"], 0]
+    tokens = info["tokens"]
+    for (i, token) in enumerate(tokens):
+        if token.type == "heading_open":
+            inline = tokens[i + 1]
+            if inline.type != "inline":
+                raise McColeExc(
+                    f"Unexpected token type {inline.type} for heading{_line(inline)}."
+                )
 
-        for token in info["tokens"]:
-            if token.type != "html_block":
+            title, key = _heading_info(token)
+            if not key:
                 continue
 
-            match = TABLE_START.search(token.content)
-            if not match:
-                continue
+            level = _heading_level(token)
+            index = _heading_index(config, info["src"], inline, label_stack, level)
+            label = f"{_choose_heading_term(index)}&nbsp;{'.'.join(index)}"
+            ref = Ref(label, slug, f"{slug}#{key}", title)
+            _add(config, info, inline, xref["hd"], key, ref, "heading")
+
+            if level > 1:
+                while parents[-1][0] >= level:
+                    parents.pop()
+                heading = Heading(key, title, [])
+                parents[-1][1].children.append(heading)
+                parents.append((level, heading))
+
+        elif token.type in KINDS:
+            kind, word = KINDS[token.type]
+            counts[kind] += 1
+            key = token.meta["id"]
+            if (kind == "fig") and not all(token.meta.values()):
+                err(config, f"Badly-formatted figure ({info['src']}/{_line(token)}).")
+            label = f"{word}&nbsp;{info['major']}.{counts[kind]}"
+            ref = Ref(label, slug, f"{slug}#{key}", None)
+            _add(config, info, token, xref[kind], key, ref, word.lower())
 
-            tbl_id = TABLE_ID.search(token.content).group(1)
 
-            if tbl_id in tbl_id_to_index:
-                err(
-                    config,
-                    f"Duplicate table ID on line ({info['src']}/{token.map[1]}).",
-                )
+def _line(token):
+    """Return line number message or empty string."""
+    if (token is None) or (token.map is None):
+        return f" ({str(token)})"
+    return f" (line {token.map[1]})"
+
 
-            current[1] += 1
-            label = tuple(current)
-            tbl_id_to_index[tbl_id] = label
-            tbl_id_to_slug[tbl_id] = info["slug"]
+# Numbered items other than headings: {token type: (table, display word)}.
+KINDS = {
+    "mccole_figure": ("fig", "Figure"),
+    "mccole_table": ("tbl", "Table"),
+}
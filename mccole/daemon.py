@@ -0,0 +1,237 @@
+"""Run builds in a long-lived process so that parsers and data stay loaded."""
+
+# Only what a client needs is imported here so that forwarding a build
+# to a running daemon doesn't pay for loading McCole or its dependencies;
+# the daemon imports the rest in `run_daemon` and `_run_build`.
+import json
+import os
+import socket
+import sys
+
+from . import __version__
+
+# Environment variable overriding where the daemon listens.
+SOCKET_VAR = "MCCOLE_SOCKET"
+
+# Environment variables that builds depend on (passed from client to daemon).
+FORWARDED_ENV = ("SOURCE_DATE_EPOCH",)
+
+# Options that start something long-running: builds using them run in the client.
+LOCAL_OPTIONS = ("daemon", "preview", "run", "watch")
+
+# Where this copy of McCole is (so a daemon only does builds for the same code).
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# How long (in seconds) to wait for a daemon to accept a build and to reply.
+CONNECT_TIMEOUT = 1
+REPLY_TIMEOUT = 600
+
+# Message format for logging (the same as a normal run's).
+LOG_FORMAT = "%(levelname)s: %(message)s"
+
+
+def forward(args):
+    """Ask a running daemon to do a build, returning its exit status (or None)."""
+    path = socket_path()
+    if (not hasattr(socket, "AF_UNIX")) or (not _owned(path)):
+        return None
+
+    request = {
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": {key: os.environ.get(key, None) for key in FORWARDED_ENV},
+        "version": __version__,
+        "package": PACKAGE_DIR,
+    }
+
+    # Build locally if the daemon can't be reached or doesn't reply properly.
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(path)
+            sock.settimeout(REPLY_TIMEOUT)
+            sock.sendall(json.dumps(request).encode("utf-8"))
+            sock.shutdown(socket.SHUT_WR)
+            with sock.makefile("rb") as reader:
+                reply = json.loads(reader.read())
+        if reply.get("local", False):
+            return None
+        stdout, stderr, status = reply["stdout"], reply["stderr"], reply["status"]
+    except (OSError, ValueError, KeyError, AttributeError, TypeError):
+        return None
+
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return status
+
+
+def run_daemon(build):
+    """Serve build requests on a Unix socket until interrupted."""
+    import signal
+    import socketserver
+
+    from .builder import Session
+    from .util import McColeExc
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise McColeExc("Unix sockets are not available on this system.")
+    path = socket_path()
+    _make_socket_dir(path)
+    if os.path.exists(path):
+        if not _owned(path):
+            raise McColeExc(f"{path} belongs to another user.")
+        if _listening(path):
+            raise McColeExc(f"A daemon is already listening on {path}.")
+        os.unlink(path)
+
+    # Parsed pages are shared by every build the daemon does.
+    session = Session()
+
+    class handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.read())
+            if _runs_locally(request):
+                reply = {"local": True}
+            else:
+                reply = _run_build(build, request, session)
+            try:
+                self.wfile.write(json.dumps(reply).encode("utf-8"))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    # Remove the socket when stopped by `kill` as well as by Ctrl-C.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Listening for builds on {path} (Ctrl-C to stop).")
+    try:
+        # Only this user may connect (builds run with this user's permissions).
+        umask = os.umask(0o077)
+        try:
+            server = socketserver.UnixStreamServer(path, handler)
+        finally:
+            os.umask(umask)
+        os.chmod(path, 0o600)
+        with server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def socket_path():
+    """Where the daemon listens (one per user unless overridden)."""
+    if SOCKET_VAR in os.environ:
+        return os.environ[SOCKET_VAR]
+    if os.environ.get("XDG_RUNTIME_DIR", None):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "mccole.sock")
+    tmp_dir = os.environ.get("TMPDIR", "/tmp")
+    return os.path.join(tmp_dir, f"mccole-{os.getuid()}", "daemon.sock")
+
+
+# ----------------------------------------------------------------------
+
+
+def _listening(path):
+    """Is something of ours accepting connections on a socket?"""
+    if not _owned(path):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            return True
+        except OSError:
+            return False
+
+
+def _make_socket_dir(path):
+    """Create the socket's directory if need be, checking that it is private."""
+    from .util import McColeExc
+
+    dir_path = os.path.dirname(path) or "."
+    os.makedirs(dir_path, mode=0o700, exist_ok=True)
+    if (SOCKET_VAR in os.environ) or os.environ.get("XDG_RUNTIME_DIR", None):
+        return
+    stat = os.stat(dir_path)
+    if (stat.st_uid != os.getuid()) or (stat.st_mode & 0o077):
+        raise McColeExc(f"{dir_path} must belong to you and be private (mode 0700).")
+
+
+def _owned(path):
+    """Does a file exist and belong to the current user?"""
+    try:
+        return os.stat(path).st_uid == os.getuid()
+    except OSError:
+        return False
+
+
+def _run_build(build, request, session):
+    """Do one build as if it had been run in the client's shell, capturing output."""
+    import contextlib
+    import io
+    import logging
+    import traceback
+
+    home = os.getcwd()
+    saved_env = {key: os.environ.get(key, None) for key in FORWARDED_ENV}
+    root = logging.getLogger()
+    saved_handlers = root.handlers[:]
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    log_handler = logging.StreamHandler(stderr)
+    log_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.handlers = [log_handler]
+
+    status = 0
+    try:
+        os.chdir(request["cwd"])
+        _set_env(request["env"])
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            build(request["args"], session)
+    except SystemExit as exc:
+        if isinstance(exc.code, str):
+            stderr.write(exc.code + "\n")
+            status = 1
+        else:
+            status = exc.code or 0
+    except Exception:
+        stderr.write(traceback.format_exc())
+        status = 1
+    finally:
+        root.handlers = saved_handlers
+        _set_env(saved_env)
+        os.chdir(home)
+
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "status": status}
+
+
+def _runs_locally(request):
+    """Must the client do this itself (different code, bad options, or not a build)?"""
+    import contextlib
+    import io
+
+    from .mccole import parse_args
+
+    if (request.get("version", None) != __version__) or (
+        request.get("package", None) != PACKAGE_DIR
+    ):
+        return True
+
+    # Use the real parser so that abbreviations (e.g., `--prev`) are recognized.
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+            io.StringIO()
+        ):
+            options = parse_args(request["args"])
+    except SystemExit:
+        return True
+    return any(getattr(options, name, None) for name in LOCAL_OPTIONS)
+
+
+def _set_env(values):
+    """Set or clear forwarded environment variables."""
+    for (key, value) in values.items():
+        if value is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = value
@@ -0,0 +1,196 @@
+"""Recognize McCole's extensions to Markdown while parsing."""
+
+from markdown_it.token import Token
+
+from .patterns import (
+    BIBLIOGRAPHY,
+    CITE,
+    FIGURE,
+    FIGURE_ALT,
+    FIGURE_CAP,
+    FIGURE_REF,
+    FIGURE_SRC,
+    GLOSS_INDEX_DEF,
+    GLOSSARY,
+    HEADING_CLASS,
+    HEADING_ID,
+    INCLUSION,
+    INCLUSION_ERASE,
+    INCLUSION_FILE,
+    INCLUSION_KEEP,
+    INCLUSION_KEEP_ERASE,
+    INCLUSION_MULTI,
+    INDEX_DEF,
+    SECTION_REF,
+    TABLE_BODY,
+    TABLE_CAP,
+    TABLE_ID,
+    TABLE_REF,
+    TABLE_START,
+    TOC,
+)
+
+
+def directives_plugin(md):
+    """Turn McCole's special HTML and heading attributes into typed tokens."""
+    md.core.ruler.after("inline", "mccole_directives", _directives)
+
+
+# ----------------------------------------------------------------------
+
+
+def _directives(state):
+    """Core rule: rewrite tokens in place."""
+    tokens = state.tokens
+    for (i, token) in enumerate(tokens):
+        if token.type == "html_block":
+            _block(token)
+        elif token.type == "heading_open":
+            _heading(token, tokens[i + 1])
+        elif (token.type == "inline") and token.children:
+            token.children = _inline(token.children)
+
+
+def _block(token):
+    """Recognize block-level directives."""
+    content = token.content
+    for (pat, kind, parse) in BLOCKS:
+        match = pat.search(content)
+        if match:
+            token.type = kind
+            token.meta = parse(content, match)
+            return
+
+
+def _heading(token, inline):
+    """Move `{.class}` and `{#id}` from heading text to attributes."""
+    # Title and ID come from the whole heading (used in cross-references).
+    match = HEADING_ID.search(inline.content)
+    if match:
+        token.meta = {"title": match.group(1), "id": match.group(3)}
+
+    # Attributes come from text children (used in rendering).
+    for child in inline.children or []:
+        if child.type != "text":
+            continue
+
+        match = HEADING_CLASS.search(child.content)
+        if match:
+            child.content = child.content.replace(match.group(2), "")
+            token.attrSet("class", match.group(3))
+
+        match = HEADING_ID.search(child.content)
+        if match:
+            child.content = child.content.replace(match.group(2), "")
+            token.attrSet("id", match.group(3))
+
+
+def _inline(children):
+    """Recognize inline directives, returning new list of children."""
+    result = []
+    i = 0
+    while i < len(children):
+        child = children[i]
+        i += 1
+        if child.type != "html_inline":
+            result.append(child)
+            continue
+
+        # Citations absorb their text and closing tag.
+        if CITE.search(child.content) and (i < len(children)):
+            keys = [k.strip() for k in children[i].content.split(",")]
+            result.append(_make_token("mccole_cite", child, {"keys": keys}))
+            i += 2
+            continue
+
+        for (pat, kind, parse) in INLINES:
+            match = pat.search(child.content)
+            if match:
+                result.append(_make_token(kind, child, parse(match)))
+                break
+        else:
+            result.append(child)
+
+    return result
+
+
+def _make_token(kind, original, meta):
+    """Make a typed inline token to replace an HTML token."""
+    token = Token(kind, "", 0, content=original.content, meta=meta)
+    token.level = original.level
+    return token
+
+
+def _parse_figure(content, match):
+    """Get figure ID, image, and caption."""
+    text = match.group(0)
+    return {
+        "id": match.group(1),
+        "src": _group(FIGURE_SRC, text),
+        "alt": _group(FIGURE_ALT, text),
+        "caption": _group(FIGURE_CAP, content),
+    }
+
+
+def _parse_inclusion(content, match):
+    """Get inclusion kind and parameters."""
+    spec = match.group(1)
+    for (pat, kind, names) in INCLUSIONS:
+        found = pat.search(spec)
+        if found:
+            return {"kind": kind, "spec": spec} | dict(zip(names, found.groups()))
+    return {"kind": None, "spec": spec}
+
+
+def _parse_table(content, match):
+    """Get table ID, caption, and Markdown body."""
+    return {
+        "id": _group(TABLE_ID, content),
+        "caption": _group(TABLE_CAP, content),
+        "body": _group(TABLE_BODY, content),
+    }
+
+
+def _parse_toc(content, match):
+    """Get table of contents level."""
+    level = match.group(1)
+    return {"level": int(level) if level.isdigit() else level}
+
+
+def _group(pat, text, group=1):
+    """Get a group from a pattern match (or None)."""
+    match = pat.search(text)
+    return match.group(group) if match else None
+
+
+# Block-level directives in order of precedence.
+BLOCKS = (
+    (BIBLIOGRAPHY, "mccole_bibliography", lambda content, match: {}),
+    (FIGURE, "mccole_figure", _parse_figure),
+    (GLOSSARY, "mccole_glossary", lambda content, match: {}),
+    (INCLUSION, "mccole_inclusion", _parse_inclusion),
+    (TABLE_START, "mccole_table", _parse_table),
+    (TOC, "mccole_toc", _parse_toc),
+)
+
+# Kinds of file inclusion and the names of their parameters.
+INCLUSIONS = (
+    (INCLUSION_FILE, "file", ("file",)),
+    (INCLUSION_KEEP, "keep", ("file", "keep")),
+    (INCLUSION_ERASE, "erase", ("file", "erase")),
+    (INCLUSION_KEEP_ERASE, "keep_erase", ("file", "keep", "erase")),
+    (INCLUSION_MULTI, "multi", ("pat", "fill")),
+)
+
+# Inline directives in order of precedence.
+INLINES = (
+    (FIGURE_REF, "mccole_figure_ref", lambda match: {"key": match.group(1)}),
+    (
+        GLOSS_INDEX_DEF,
+        "mccole_term",
+        lambda match: {"gloss": match.group(1), "index": match.group(2)},
+    ),
+    (INDEX_DEF, "mccole_term", lambda match: {"gloss": None, "index": match.group(1)}),
+    (SECTION_REF, "mccole_section_ref", lambda match: {"key": match.group(1)}),
+    (TABLE_REF, "mccole_table_ref", lambda match: {"key": match.group(1)}),
+)
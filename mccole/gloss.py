@@ -2,9 +2,8 @@
 
 import re
 
-import yaml
-
-from .util import make_md
+from .cache import cache_fragment, cache_load
+from .util import get_md, load_yaml, md_fingerprint
 
 MULTISPACE = re.compile(r"\s+", re.DOTALL)
 
@@ -15,21 +14,15 @@ def gloss_keys(config):
 
 
 def gloss_to_html(config):
-    """Convert glossary data to HTML."""
-    lang = config["lang"]
-    internal = {entry["key"]:entry[lang]["term"] for entry in config["gloss_data"]}
-    entries = [_gloss_to_markdown(entry, lang, internal) for entry in config["gloss_data"]]
-    text = "\n\n".join(entries)
-    md = make_md()
-    html = md.render(text)
-    return html
+    """Convert glossary data to HTML (re-using cached HTML if possible)."""
+    inputs = [config["gloss_data"], md_fingerprint()]
+    return cache_fragment(config, "gloss", inputs, lambda: _gloss_to_html(config))
 
 
 def load_gloss(config):
     """Read glossary file if there is one."""
     if "gloss" in config:
-        with open(config["gloss"], "r") as reader:
-            config["gloss_data"] = yaml.safe_load(reader)
+        config["gloss_data"] = cache_load(config, config["gloss"], _read_gloss)
     else:
         config["gloss_data"] = {}
 
@@ -37,6 +30,22 @@ def load_gloss(config):
 # ----------------------------------------------------------------------
 
 
+def _gloss_to_html(config):
+    """Convert glossary data to HTML."""
+    lang = config["lang"]
+    internal = {entry["key"]:entry[lang]["term"] for entry in config["gloss_data"]}
+    entries = [_gloss_to_markdown(entry, lang, internal) for entry in config["gloss_data"]]
+    text = "\n\n".join(entries)
+    html = get_md().render(text)
+    return html
+
+
+def _read_gloss(filename):
+    """Parse a YAML glossary file."""
+    with open(filename, "r") as reader:
+        return load_yaml(reader)
+
+
 def _gloss_to_markdown(entry, lang, internal):
     """Convert single glossary entry to Markdown."""
     first = f'<span class="glosskey" id="{entry["key"]}">{entry[lang]["term"]}</span>'
@@ -1,108 +1,106 @@
 """Handle file inclusion."""
 
 import os
+from bisect import bisect_left
 
+from markdown_it.common.utils import escapeHtml
 
-from .patterns import (
-    INCLUSION_FILE,
-    INCLUSION_KEEP,
-    INCLUSION_ERASE,
-    INCLUSION_KEEP_ERASE,
-    INCLUSION_MULTI,
-)
-from .util import err, make_md
+from .patterns import INCLUSION_MARKER
+from .util import err, load_cached
 
 
-def inclusion_to_html(config, info, spec):
+def inclusion_to_html(config, info, meta):
     """Handle a file inclusion."""
-    for (pat, handler) in (
-        (INCLUSION_FILE, _file),
-        (INCLUSION_KEEP, _keep),
-        (INCLUSION_ERASE, _erase),
-        (INCLUSION_KEEP_ERASE, _keep_erase),
-        (INCLUSION_MULTI, _multi),
-    ):
-        match = pat.search(spec)
-        if match:
-            return handler(config, info, match)
-    err(config, f"Unrecognized inclusion spec '{spec}'.")
-    return ""
+    handler = HANDLERS.get(meta["kind"], None)
+    if handler is None:
+        err(config, f"Unrecognized inclusion spec '{meta['spec']}'.")
+        return ""
+    return handler(config, info, meta)
 
 
 # ----------------------------------------------------------------------
 
 
-def _erase(config, info, match):
+def _erase(config, info, meta):
     """Handle an erasing file inclusion."""
-    filename = _make_filename(info, match.group(1))
-    kind = filename.split('.')[-1]
-    key = match.group(2)
-    with open(filename, "r") as reader:
-        lines = reader.readlines()
-        lines = _remove_lines(config, lines, key)
-        return _make_html(lines, kind)
+    return _include(config, info, meta["file"], erase=meta["erase"])
 
 
-def _file(config, info, match):
+def _file(config, info, meta):
     """Handle a simple file inclusion."""
-    filename = _make_filename(info, match.group(1))
-    kind = filename.split('.')[-1]
-    with open(filename, "r") as reader:
-        lines = reader.readlines()
-        return _make_html(lines, kind)
+    return _include(config, info, meta["file"])
 
 
-def _keep(config, info, match):
+def _keep(config, info, meta):
     """Handle a sliced file inclusion."""
-    filename = _make_filename(info, match.group(1))
-    kind = filename.split('.')[-1]
-    key = match.group(2)
-    with open(filename, "r") as reader:
-        lines = reader.readlines()
-        lines = _select_lines(config, lines, key)
-        return _make_html(lines, kind)
+    return _include(config, info, meta["file"], keep=meta["keep"])
 
 
-def _keep_erase(config, info, match):
+def _keep_erase(config, info, meta):
     """Handle an inclusion that keeps some content but erases other."""
-    filename = _make_filename(info, match.group(1))
-    kind = filename.split('.')[-1]
-    keep_key = match.group(2)
-    erase_key = match.group(3)
-    with open(filename, "r") as reader:
-        lines = reader.readlines()
-        lines = _select_lines(config, lines, keep_key)
-        lines = _remove_lines(config, lines, erase_key)
-        return _make_html(lines, kind)
+    return _include(config, info, meta["file"], keep=meta["keep"], erase=meta["erase"])
 
 
-def _multi(config, info, match):
+def _multi(config, info, meta):
     """Handle multiple file inclusion."""
     result = []
-    pat = match.group(1)
-    for fill in [s.strip() for s in match.group(2).split()]:
-        filename = _make_filename(info, pat.replace("*", fill))
-        kind = filename.split('.')[-1]
-        with open(filename, "r") as reader:
-            lines = reader.readlines()
-            result.append(_make_html(lines, kind))
+    pat = meta["pat"]
+    for fill in [s.strip() for s in meta["fill"].split()]:
+        result.append(_include(config, info, pat.replace("*", fill)))
     return "\n\n".join(result)
 
 
 # ----------------------------------------------------------------------
 
 
-def _find_markers(lines, key):
-    start = f"[{key}]"
-    stop = f"[/{key}]"
-    i_start = None
-    i_stop = None
+def _find_markers(entry, key, lo, hi):
+    """Find the last start and stop markers for `key` in lines `lo:hi`."""
+    starts, stops = entry["markers"].get(key, ([], []))
+    return _last(starts, lo, hi), _last(stops, lo, hi)
+
+
+def _include(config, info, name, keep=None, erase=None):
+    """Include (part of) a file, re-using HTML for the same file and keys."""
+    filename = _make_filename(info, name)
+    info["deps"]["files"].add(filename)
+    entry = load_cached(filename, _load_file)
+    if (keep, erase) in entry["html"]:
+        return entry["html"][(keep, erase)]
+
+    lines, ok = _slice(config, entry, keep, erase)
+    html = _make_html(lines, filename.split(".")[-1])
+    if ok:
+        entry["html"][(keep, erase)] = html
+    return html
+
+
+def _last(positions, lo, hi):
+    """Find the last of a sorted list of positions in `lo:hi` (or None)."""
+    i = bisect_left(positions, hi)
+    if (i > 0) and (positions[i - 1] >= lo):
+        return positions[i - 1]
+    return None
+
+
+def _load_file(filename):
+    """Read an included file and index its markers in a single scan."""
+    with open(filename, "r") as reader:
+        lines = reader.readlines()
+
+    # {key: ([lines with start markers], [lines with stop markers])}
+    markers = {}
     for (i, line) in enumerate(lines):
-        if start in line:
-            i_start = i
-        elif stop in line:
-            i_stop = i
-    return i_start, i_stop
+        if "[" not in line:
+            continue
+        found = INCLUSION_MARKER.findall(line)
+        starts = {key for (slash, key) in found if not slash}
+        stops = {key for (slash, key) in found if slash} - starts
+        for key in starts:
+            markers.setdefault(key, ([], []))[0].append(i)
+        for key in stops:
+            markers.setdefault(key, ([], []))[1].append(i)
+
+    return {"lines": lines, "markers": markers, "html": {}}
 
 
 def _make_filename(info, name):
@@ -111,26 +109,40 @@ def _make_filename(info, name):
 
 
 def _make_html(lines, kind):
-    """Construct HTML inclusion from lines."""
-    body = "\n".join(x.rstrip() for x in lines)
-    markdown = f"```{kind}\n{body}\n```"
-    md = make_md()
-    return md.render(markdown)
-
-
-def _remove_lines(config, lines, key):
-    """Remove lines between markers."""
-    start, stop = _find_markers(lines, key)
-    if start is None:
-        err(config, f"Failed to match {start} / {stop}")
-        return []
-    return lines[:start] + lines[stop+1:]
-
-
-def _select_lines(config, lines, key):
-    """Select lines between markers."""
-    start, stop = _find_markers(lines, key)
-    if start is None:
-        err(config, f"Failed to match {start} / {stop}")
-        return []
-    return lines[start+1:stop]
+    """Construct HTML inclusion from lines (as a fenced code block would)."""
+    body = escapeHtml("\n".join(x.rstrip() for x in lines))
+    lang = kind.split()[0] if kind.strip() else ""
+    attrs = f' class="language-{escapeHtml(lang)}"' if lang else ""
+    return f"<pre><code{attrs}>{body}\n</code></pre>\n"
+
+
+def _slice(config, entry, keep, erase):
+    """Select and/or remove lines between markers, reporting success."""
+    lines = entry["lines"]
+    lo, hi = 0, len(lines)
+
+    if keep is not None:
+        start, stop = _find_markers(entry, keep, lo, hi)
+        if start is None:
+            err(config, f"Failed to match {start} / {stop}")
+            return [], False
+        lo, hi = start + 1, hi if stop is None else stop
+
+    if erase is not None:
+        start, stop = _find_markers(entry, erase, lo, hi)
+        if (start is None) or (stop is None):
+            err(config, f"Failed to match {start} / {stop}")
+            return [], False
+        return lines[lo:start] + lines[stop + 1 : hi], True  # noqa e203
+
+    return lines[lo:hi], True
+
+
+# How to handle each kind of inclusion.
+HANDLERS = {
+    "erase": _erase,
+    "file": _file,
+    "keep": _keep,
+    "keep_erase": _keep_erase,
+    "multi": _multi,
+}
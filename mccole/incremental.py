@@ -0,0 +1,245 @@
+"""Keep track of build inputs so that unchanged pages can be skipped."""
+
+import json
+import logging
+import os
+from datetime import date
+from glob import glob
+from pathlib import Path
+
+from . import __version__
+from .util import (
+    LOGGER_NAME,
+    SOURCE_DATE_EPOCH,
+    file_stamp,
+    hash_data,
+    hash_file,
+    hash_text,
+)
+
+# Where to store the manifest (relative to the output directory).
+MANIFEST_FILE = os.path.join(".mccole", "build.json")
+
+# Where to store what a no-op build has to check (relative to the output directory).
+STAMPS_FILE = os.path.join(".mccole", "stamps.json")
+
+# Change this when the manifest format changes.
+MANIFEST_VERSION = 1
+
+# Options that print reports: builds using them always run so the reports are complete.
+REPORTING = ("cache_stats", "links_used", "manifest", "profile", "sync", "unused")
+
+# Where to report.
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+def check_fresh(options, config, xref):
+    """Mark pages whose inputs haven't changed since the last build."""
+    if not options.incremental:
+        return
+
+    previous = _load_manifest(config["dst"])
+    if previous.get("global", None) != _global_inputs(options, config):
+        LOGGER.info("global inputs changed: rebuilding all pages")
+        return
+
+    data = data_hashes(config)
+    for info in config["pages"]:
+        record = previous["pages"].get(info["slug"], None)
+        if (record is None) or (not _is_fresh(config, xref, data, info, record)):
+            continue
+        info["fresh"] = True
+        info["record"] = record
+        info["deps"] = {
+            "data": set(record["data"]),
+            "files": set(record["files"]),
+            "xref": {tuple(key) for key in record["xref"]},
+        }
+        info["seen"] = {key: set(values) for (key, values) in record["seen"].items()}
+        info["errors"] = record["errors"]
+
+
+def data_hashes(config):
+    """Hash the shared data files that pages may depend on."""
+    return {
+        "bib": _hash_or_none(config.get("bib", None)),
+        "gloss": _hash_or_none(config.get("gloss", None)),
+        "cited": hash_data(sorted(config.get("cited", []))),
+    }
+
+
+def make_record(config, xref, data, info):
+    """Record the inputs a page depends on."""
+    deps = info["deps"]
+    xref_keys = sorted(list(k) for k in deps["xref"])
+    return {
+        "dst": info["dst"],
+        "src": _hash_or_none(info["src"]),
+        "template": _template_hash(config, info),
+        "files": {f: _hash_or_none(f) for f in sorted(deps["files"])},
+        "data": {d: data[d] for d in sorted(deps["data"])},
+        "xref": xref_keys,
+        "xref_hash": _xref_hash(xref, xref_keys),
+        "seen": {key: sorted(values) for (key, values) in info["seen"].items()},
+        "errors": info["errors"],
+    }
+
+
+def same_inputs(config, xref, data, info, record):
+    """Check whether a page's recorded inputs match current ones."""
+    return (
+        (record["src"] == _hash_or_none(info["src"]))
+        and (record["template"] == _template_hash(config, info))
+        and all(_hash_or_none(f) == h for (f, h) in record["files"].items())
+        and all(data[d] == h for (d, h) in record["data"].items())
+        and (record["xref_hash"] == _xref_hash(xref, record["xref"]))
+    )
+
+
+def save_manifest(options, config, xref):
+    """Save information about this build's inputs for next time."""
+    if not options.incremental:
+        return
+
+    data = data_hashes(config)
+    manifest = {
+        "global": _global_inputs(options, config),
+        "pages": {
+            info["slug"]: info["record"]
+            if info.get("fresh", False)
+            else make_record(config, xref, data, info)
+            for info in config["pages"]
+        },
+    }
+
+    path = Path(config["dst"], MANIFEST_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2))
+    Path(config["dst"], STAMPS_FILE).write_text(json.dumps(_stamps(options, config)))
+
+
+def unchanged_build(options):
+    """Get the last build's errors if no input or output has changed since (or None)."""
+    if (not options.incremental) or any(getattr(options, o) for o in REPORTING):
+        return None
+
+    previous = _load_stamps(options.dst)
+    if (
+        (previous is None)
+        or (previous["version"] != [MANIFEST_VERSION, __version__])
+        or (previous["options"] != _build_options(options))
+        or (previous["date"] != _date_inputs(previous["reproducible"]))
+        or any(sorted(glob(p)) != found for (p, found) in previous["globs"].items())
+        or any(_json_stamp(f) != s for (f, s) in previous["files"].items())
+    ):
+        return None
+
+    LOGGER.info("nothing has changed since the last build")
+    return previous["errors"]
+
+
+# ----------------------------------------------------------------------
+
+
+def _build_options(options):
+    """Get the options that affect what a build does (i.e., not how much it logs)."""
+    return {k: v for (k, v) in vars(options).items() if k != "logging"}
+
+
+def _date_inputs(reproducible):
+    """Get what the build date depends on other than the times of input files."""
+    if SOURCE_DATE_EPOCH in os.environ:
+        return os.environ[SOURCE_DATE_EPOCH]
+    return None if reproducible else date.today().isoformat()
+
+
+def _global_inputs(options, config):
+    """Summarize inputs that every page depends on."""
+    from .write import build_date
+
+    return {
+        "version": [MANIFEST_VERSION, __version__],
+        "config": _hash_or_none(options.config),
+        "links": hash_data(config.get("links_data", None)),
+        "src": config["src"],
+        "dst": config["dst"],
+        "builddate": build_date(config),
+        "cited_only": config.get("cited_only", False),
+    }
+
+
+def _hash_or_none(filename):
+    """Hash a file if it exists, returning None otherwise."""
+    if (filename is None) or (not os.path.isfile(filename)):
+        return None
+    return hash_file(filename)
+
+
+def _is_fresh(config, xref, data, info, record):
+    """Check that a page's output exists and its inputs are unchanged."""
+    return (
+        (record["dst"] == info["dst"])
+        and os.path.isfile(info["dst"])
+        and same_inputs(config, xref, data, info, record)
+    )
+
+
+def _json_stamp(filename):
+    """Get a file's stamp in the form it is saved in (a list rather than a tuple)."""
+    stamp = file_stamp(filename)
+    return None if stamp is None else list(stamp)
+
+
+def _load_manifest(dst):
+    """Load previous manifest (if any)."""
+    path = Path(dst, MANIFEST_FILE)
+    if not path.is_file():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except json.JSONDecodeError:
+        LOGGER.warning(f"ignoring badly-formatted manifest {path}")
+        return {}
+
+
+def _load_stamps(dst):
+    """Load what the last build recorded for no-op checks (or None)."""
+    try:
+        with open(os.path.join(dst, STAMPS_FILE), "r") as reader:
+            return json.load(reader)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _stamps(options, config):
+    """Record what has to be checked to tell that the next build would do nothing."""
+    from .watch import watched_files
+
+    patterns = ["_template/*.html"]
+    patterns += [os.path.join(config["src"], p) for p in config.get("copy", [])]
+    globs = {p: sorted(glob(p)) for p in patterns}
+
+    files = watched_files(options, config)
+    files |= {f for found in globs.values() for f in found}
+    files |= {info["dst"] for info in config["pages"]}
+    files |= set(config.get("copied", []))
+    return {
+        "version": [MANIFEST_VERSION, __version__],
+        "options": _build_options(options),
+        "reproducible": config.get("reproducible", False),
+        "date": _date_inputs(config.get("reproducible", False)),
+        "globs": globs,
+        "files": {f: _json_stamp(f) for f in sorted(files)},
+        "errors": config.get("error_log", []),
+    }
+
+
+def _template_hash(config, info):
+    """Hash the template a page uses (if any)."""
+    name = info["metadata"].get("template", None)
+    return hash_text(f"{name}\n{config['template'].get(name, '')}")
+
+
+def _xref_hash(xref, keys):
+    """Hash the cross-reference entries a page used."""
+    return hash_data([xref.get(table, {}).get(key, None) for (table, key) in keys])
@@ -0,0 +1,47 @@
+"""Share the links table between parses instead of appending it to each page."""
+
+from collections import ChainMap
+
+from markdown_it.common.utils import normalizeReference
+
+
+def links_plugin(md):
+    """Resolve references using shared links passed in the parser's `env`."""
+    md.core.ruler.before("inline", "mccole_links", _links)
+
+
+def make_link_refs(md, links):
+    """Turn links data into markdown-it references (once per parser)."""
+    refs = {}
+    for link in links or []:
+        label = normalizeReference(link["key"])
+        href = md.normalizeLink(link["url"])
+        if label and (label not in refs) and md.validateLink(href):
+            refs[label] = {"title": "", "href": href, "key": link["key"]}
+    return refs
+
+
+# ----------------------------------------------------------------------
+
+
+class LinkRefs(ChainMap):
+    """Page references backed by shared links, remembering which links are used."""
+
+    def __init__(self, page, shared):
+        """Look in the page's own definitions first."""
+        super().__init__(page, shared)
+        self.used = set()
+
+    def __getitem__(self, label):
+        """Get a reference, recording it if it came from the shared links."""
+        value = super().__getitem__(label)
+        if "key" in value:
+            self.used.add(value["key"])
+        return value
+
+
+def _links(state):
+    """Core rule: chain shared links behind the page's own definitions."""
+    if "links" in state.env:
+        page = state.env.get("references", {})
+        state.env["references"] = LinkRefs(page, state.env["links"])
@@ -3,18 +3,14 @@
 import argparse
 import logging
 import os
-import shutil
 import sys
 
-from .bib import bib_keys, load_bib
-from .config import DEFAULT_CONFIG_FILE, DEFAULTS, get_config, load_templates
-from .crossref import cross_reference
-from .gloss import gloss_keys, load_gloss
-from .read import collect_pages
-from .server import run_server
-from .tokenize import tokenize
-from .util import LOGGER_NAME, McColeExc, pretty
-from .write import copy_files, generate_pages
+from .config import DEFAULT_CONFIG_FILE, DEFAULTS
+from .incremental import unchanged_build
+from .util import LOGGER_NAME, McColeExc
+
+# Other modules are imported when they are needed so that `--help`,
+# errors in options, and builds with nothing to do finish quickly.
 
 # ----------------------------------------------------------------------
 
@@ -23,53 +19,71 @@ LOGGING_LEVELS = "debug info warning error critical".split()
 LOGGER = None
 
 
-def main(args):
-    """Parse arguments and execute."""
+def main(args, session=None):
+    """Parse arguments and execute (re-using data from `session` if given)."""
     try:
-        options = _parse_args(args)
+        options = parse_args(args)
         _setup(options)
-        config = get_config(options)
-        LOGGER.info(f"configuration is {pretty(config)}")
+        if options.daemon:
+            from .daemon import run_daemon
+
+            run_daemon(main)
+            return
 
-        load_bib(config)
-        load_gloss(config)
-        load_templates(config)
+        if options.preview:
+            from .preview import preview
 
-        config["pages"] = collect_pages(config)
-        LOGGER.info(f"pages are {pretty(config['pages'])}")
+            preview(options, _session(session))
+            return
 
-        tokenize(config)
-        xref = cross_reference(config)
-        LOGGER.info(f"xref is {pretty(xref)}")
+        if options.watch:
+            from .watch import watch
 
-        _clean_output(options, config)
-        seen = generate_pages(config, xref)
-        copy_files(config)
+            session = _session(session)
+            config = session.build(options).config
+            watch(options, config, lambda opt: session.build(opt).config)
+            return
 
-        _warn_unused(options, config, xref, seen)
-        _report_errors(config)
+        # Only report last time's errors if an incremental build would do nothing.
+        errors = unchanged_build(options)
+        if errors is None:
+            dst = _session(session).build(options).config["dst"]
+        else:
+            for msg in errors:
+                print(msg)
+            dst = options.dst
 
-        run_server(options, config["dst"])
+        if options.run:
+            from .server import run_server
+
+            run_server(options, dst)
 
     except McColeExc as exc:
         LOGGER.error(f"McCole failed: {exc.msg}")
         sys.exit(1)
 
 
-# ----------------------------------------------------------------------
-
-
-def _clean_output(options, config):
-    """Delete output directory unless told not to."""
-    if (not options.keep) and os.path.exists(config["dst"]):
-        shutil.rmtree(config["dst"])
-
-
-def _parse_args(args):
+def parse_args(args):
     """Handle command-line arguments."""
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
+    parser.add_argument(
+        "--cache", type=str, default=None, help="Cache directory (off by default)."
+    )
+    parser.add_argument(
+        "--cache-stats", action="store_true", help="Report cache hits and misses."
+    )
+    parser.add_argument(
+        "--cited-only",
+        action="store_true",
+        help="Only include cited entries in the bibliography.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and do builds requested by other McCole commands.",
+    )
     parser.add_argument(
         "-d", "--dst", type=str, default=DEFAULTS["dst"], help="Destination directory."
     )
@@ -87,9 +101,32 @@ def _parse_args(args):
         default=DEFAULT_CONFIG_FILE,
         help="Configuration file.",
     )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Only regenerate pages whose inputs have changed.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=_positive_int,
+        default=1,
+        help="Number of worker processes to use.",
+    )
     parser.add_argument(
         "-k", "--keep", action="store_true", help="Keep pre-existing output."
     )
+    parser.add_argument(
+        "--link",
+        action="store_true",
+        help="Hard-link copied files to their sources where possible.",
+    )
+    parser.add_argument(
+        "--links-used",
+        action="store_true",
+        help="Report which links each page uses.",
+    )
     parser.add_argument(
         "-L",
         "--logging",
@@ -98,21 +135,77 @@ def _parse_args(args):
         default="error",
         help="Logging level.",
     )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="mccole-trace.json",
+        default=None,
+        help="Report time and memory used and write a trace file.",
+    )
+    parser.add_argument(
+        "--manifest",
+        action="store_true",
+        help="Record output files and report which changed since the last build.",
+    )
+    parser.add_argument(
+        "--preview",
+        action="store_true",
+        help="Serve pages from memory, rendering them on demand (requires -r).",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Keep output but delete files this build didn't produce.",
+    )
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Use the newest input's time as the build date.",
+    )
     parser.add_argument("-r", "--run", type=int, help="Run server on specified port.")
     parser.add_argument(
         "-s", "--src", type=str, default=DEFAULTS["src"], help="Source directory."
     )
+    parser.add_argument(
+        "--sync",
+        type=str,
+        nargs="?",
+        choices=["mtime", "hash"],
+        const="mtime",
+        default=None,
+        help="Only copy files that have changed (by size and mtime or by hash).",
+    )
     parser.add_argument(
         "-u", "--unused", action="store_true", help="Warn about unreferenced items."
     )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="Rebuild when inputs change (implies --incremental).",
+    )
     return parser.parse_args(args)
 
 
-def _report_errors(config):
-    """Report any errors found."""
-    if "error_log" in config:
-        for msg in config["error_log"]:
-            print(msg)
+# ----------------------------------------------------------------------
+
+
+def _positive_int(text):
+    """Convert command-line argument to a positive integer."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"{text} is not a positive integer")
+    return value
+
+
+def _session(session):
+    """Use the given session or start a new one."""
+    if session is not None:
+        return session
+    from .builder import Session
+
+    return Session()
 
 
 def _setup(options):
@@ -124,32 +217,15 @@ def _setup(options):
     LOGGER = logging.getLogger(LOGGER_NAME)
     LOGGER.setLevel(logging._nameToLevel[level_name])
 
+    # Previewing needs a server.
+    if options.preview and not options.run:
+        raise McColeExc("--preview requires -r/--run.")
+
+    # Watching only rebuilds what has changed.
+    if options.watch:
+        options.incremental = True
+
     # Working directory.
     if options.chdir is not None:
         logging.info(f"changing working directory to {options.chdir}")
         os.chdir(options.chdir)
-
-
-def _warn_unused(options, config, xref, seen):
-    """Warn about unused labels if asked to."""
-    if not options.unused:
-        return
-
-    _warn_unused_title("citation", bib_keys(config) - seen["cite"])
-    _warn_unused_title("glossary", gloss_keys(config) - seen["gloss_ref"])
-
-    for (title, defined_key, used_key) in (
-        ("figure", "fig_id_to_index", "figure_ref"),
-        ("table", "tbl_id_to_index", "table_ref"),
-    ):
-        defined = set(xref[defined_key].keys())
-        used = seen[used_key]
-        _warn_unused_title(title, defined - used)
-
-
-def _warn_unused_title(title, items):
-    """Warn about a single set of missing items (if any)."""
-    if not items:
-        return
-    unused = "\n- ".join(sorted(items))
-    print(f"Unreferenced {title}:\n- {unused}")
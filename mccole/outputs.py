@@ -0,0 +1,84 @@
+"""Record what a build produced and how it differs from the last build."""
+
+import json
+import logging
+import os
+from pathlib import Path
+
+from .util import LOGGER_NAME, hash_file
+
+# Where to record outputs (relative to output directory).
+OUTPUTS_FILE = os.path.join(".mccole", "outputs.json")
+
+# Where to report.
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+def report_outputs(options, config):
+    """Summarize changes to outputs if recording them."""
+    if not options.manifest:
+        return
+    diff = config["outputs_diff"]
+    path = Path(config["dst"], OUTPUTS_FILE)
+    print(
+        f"Outputs: {len(diff['added'])} added, {len(diff['changed'])} changed, "
+        f"{len(diff['removed'])} removed ({path})."
+    )
+
+
+def save_outputs(options, config):
+    """Write a manifest of output files and a diff against the previous one."""
+    if not options.manifest:
+        return
+
+    path = Path(config["dst"], OUTPUTS_FILE)
+    previous = _load_outputs(path)
+    filenames = [info["dst"] for info in config["pages"]] + config.get("copied", [])
+    current = {}
+    for filename in filenames:
+        key = Path(os.path.relpath(filename, config["dst"])).as_posix()
+        current[key] = _describe(filename, previous.get(key, None))
+
+    diff = {
+        "added": sorted(set(current) - set(previous)),
+        "changed": sorted(
+            key
+            for key in set(current) & set(previous)
+            if current[key]["hash"] != previous[key]["hash"]
+        ),
+        "removed": sorted(set(previous) - set(current)),
+    }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"files": current, "diff": diff}, indent=1))
+    config["outputs_diff"] = diff
+
+
+# ----------------------------------------------------------------------
+
+
+def _describe(filename, previous):
+    """Get hash and size of a file, re-using the previous hash if it's unchanged."""
+    stat = os.stat(filename)
+    if (
+        (previous is not None)
+        and (previous["size"] == stat.st_size)
+        and (previous["mtime_ns"] == stat.st_mtime_ns)
+    ):
+        return previous
+    return {
+        "hash": hash_file(filename),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def _load_outputs(path):
+    """Load the previous build's outputs (if any)."""
+    if not path.is_file():
+        return {}
+    try:
+        return json.loads(path.read_text())["files"]
+    except (json.JSONDecodeError, KeyError):
+        LOGGER.warning(f"ignoring badly-formatted outputs file {path}")
+        return {}
@@ -13,9 +13,8 @@ CITE = re.compile(r"<cite>")
 # Definitions are `<span g="key">text</span>` for glossary terms,
 # `<span i="key">text</span>` for indexing terms,
 # and `<span g="key" i="other_key">text</span>` for both.
-GLOSS_DEF = re.compile(r'<span\s+g="(.+?)">')
-INDEX_DEF = re.compile(r'<span\s+i="(.+?)">')
-GLOSS_INDEX_DEF = re.compile(r'<span\s+g="(.+?)"\s+i="(.+?)">')
+GLOSS_INDEX_DEF = re.compile(r'<span\s+g="([^"]+)"(?:\s+i="([^"]+)")?\s*>')
+INDEX_DEF = re.compile(r'<span\s+i="([^"]+)"\s*>')
 
 # Headings with classes are `### Text {.class}`.
 HEADING_CLASS = re.compile(r"\s*(.+?)(\s*\{\.(.+?)\})")
@@ -37,6 +36,7 @@ INCLUSION_KEEP = re.compile(r'^\s*file="([^"]+)"\s+keep="([^"]+)"\s*$')
 INCLUSION_ERASE = re.compile(r'^\s*file="([^"]+)"\s+erase="([^"]+)"\s*$')
 INCLUSION_KEEP_ERASE = re.compile(r'^\s*file="([^"]+)"\s+keep="([^"]+)"\s+erase="([^"]+)"\s*$')
 INCLUSION_MULTI = re.compile(r'^\s*pat="([^"]+)"\s+fill="([^"]+)"\s*$')
+INCLUSION_MARKER = re.compile(r"\[(/?)([^\[\]]+)\]")
 
 # Figures are:
 # <figure id="key">
@@ -0,0 +1,167 @@
+"""Serve pages from memory, rendering each one when it is requested."""
+
+import logging
+import os
+import posixpath
+import threading
+import time
+from fnmatch import fnmatch
+from pathlib import Path, PurePosixPath
+
+from .builder import Builder
+from .incremental import data_hashes, make_record, same_inputs
+from .server import Reloader, run_server
+from .util import LOGGER_NAME, McColeExc
+from .watch import POLL_INTERVAL, file_stamps, watched_files
+from .write import make_site, render_page
+
+# Where to report.
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+class Preview:
+    """Parsed pages, cross-references, and rendered HTML kept in memory."""
+
+    def __init__(self, options, session):
+        """Parse pages and index cross-references, but don't render anything."""
+        self.options = options
+        self.session = session
+        self.lock = threading.Lock()
+        self.rendered = {}
+        self.stamps = None
+        self._load()
+
+    def is_page(self, path):
+        """Is this URL path a page?"""
+        return _page_key(path) in self.pages
+
+    def page(self, path):
+        """Get (HTML, time rendered) for a page, rendering it if necessary (or None)."""
+        with self.lock:
+            self._check()
+            info = self.pages.get(_page_key(path), None)
+            if info is None:
+                return None
+
+            cached = self.rendered.get(info["slug"], None)
+            if (cached is not None) and same_inputs(
+                self.config, self.xref, self.data, info, cached[2]
+            ):
+                return cached[0], cached[1]
+
+            start = time.time()
+            num_errors = len(self.config.get("error_log", []))
+            html = render_page(self.config, self.xref, self.site, info)
+            info["errors"] = self.config.get("error_log", [])[num_errors:]
+            for msg in info["errors"]:
+                print(msg)
+            record = make_record(self.config, self.xref, self.data, info)
+            self.rendered[info["slug"]] = (html, time.time(), record)
+            self.stamps |= file_stamps(record["files"])
+            elapsed = int(1000 * (time.time() - start))
+            LOGGER.info(f"rendered {info['slug']} in {elapsed} ms")
+            return html, self.rendered[info["slug"]][1]
+
+    def refresh(self):
+        """Re-read inputs if any have changed, returning True if they had."""
+        with self.lock:
+            return self._check()
+
+    def static_file(self, path):
+        """Find a file in the source tree that a build would copy (or None)."""
+        rel = PurePosixPath(posixpath.normpath(path.lstrip("/")))
+        if (".." in rel.parts) or (str(rel) == "."):
+            return None
+        if not any(_matches(rel, pattern) for pattern in self.config["copy"]):
+            return None
+        filename = os.path.join(self.config["src"], *rel.parts)
+        if any(fnmatch(filename, p) for p in self.config["exclude"]):
+            return None
+        return filename if os.path.isfile(filename) else None
+
+    def _check(self):
+        """Reload if any input (including files pages have included) has changed."""
+        stamps = file_stamps(self._watched())
+        if stamps == self.stamps:
+            return False
+        try:
+            self._load()
+        except McColeExc as exc:
+            LOGGER.error(f"McCole failed: {exc.msg}")
+            self.stamps = stamps
+        return True
+
+    def _load(self):
+        """Parse pages (re-using unchanged ones) and index cross-references."""
+        start = time.time()
+        builder = Builder(self.options, self.session)
+        builder.load()
+        builder.parse()
+        builder.index()
+        config, xref = builder.state.config, builder.state.xref
+        for msg in config.get("error_log", []):
+            print(msg)
+
+        self.config = config
+        self.xref = xref
+        self.data = data_hashes(config)
+        self.site = make_site(config)
+        self.pages = {
+            Path(os.path.relpath(info["dst"], config["dst"])).as_posix(): info
+            for info in config["pages"]
+        }
+
+        # Forget pages that no longer exist; others are re-checked when requested.
+        slugs = {info["slug"] for info in config["pages"]}
+        self.rendered = {s: r for (s, r) in self.rendered.items() if s in slugs}
+
+        self.stamps = file_stamps(self._watched())
+        elapsed = int(1000 * (time.time() - start))
+        LOGGER.info(f"loaded {len(self.pages)} pages in {elapsed} ms")
+
+    def _watched(self):
+        """Find the files that inputs and rendered pages depend on."""
+        files = watched_files(self.options, self.config)
+        for (_, _, record) in self.rendered.values():
+            files |= set(record["files"])
+        return files
+
+
+def preview(options, session):
+    """Serve pages from memory, reloading browsers when inputs change if watching."""
+    site = Preview(options, session)
+    print(f"Previewing on port {options.run} (Ctrl-C to stop).")
+    if not options.watch:
+        run_server(options, site.config["src"], preview=site)
+        return
+
+    reloader = Reloader()
+    threading.Thread(
+        target=run_server,
+        args=(options, site.config["src"], reloader, site),
+        daemon=True,
+    ).start()
+    try:
+        while True:
+            time.sleep(POLL_INTERVAL)
+            if site.refresh():
+                reloader.notify()
+    except KeyboardInterrupt:
+        pass
+
+
+# ----------------------------------------------------------------------
+
+
+def _matches(rel, pattern):
+    """Does a relative path match a copy pattern the way `glob` would?"""
+    pattern = PurePosixPath(pattern)
+    return (len(rel.parts) == len(pattern.parts)) and rel.match(str(pattern))
+
+
+def _page_key(path):
+    """Turn a URL path into the path of the page it refers to."""
+    path = path.lstrip("/")
+    if (not path) or path.endswith("/"):
+        path += "index.html"
+    return posixpath.normpath(path)
@@ -1,28 +1,335 @@
 """Run simple server for previewing."""
 
+import email.utils
+import gzip
+import hashlib
 import http.server
+import io
 import logging
+import os
+import re
 import socketserver
+import threading
+from urllib.parse import unquote, urlsplit
 
 from .util import LOGGER_NAME
 
 
 LOGGER = logging.getLogger(LOGGER_NAME)
 
+# Where browsers listen for reload notifications.
+RELOAD_PATH = "/__mccole__/reload"
 
-class server(socketserver.TCPServer):
+# Script added to HTML pages to listen for reload notifications.
+RELOAD_SCRIPT = (
+    f'<script>new EventSource("{RELOAD_PATH}").onmessage = '
+    "() => location.reload();</script>\n"
+).encode("utf-8")
+
+# Content types worth compressing.
+COMPRESSIBLE = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# Compression level (fast rather than small, since this is for previewing).
+GZIP_LEVEL = 6
+
+# Compressed files: {filename: (etag, compressed bytes)}.
+GZIPPED = {}
+
+# A single byte range like "bytes=100-199", "bytes=100-", or "bytes=-100".
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# How often to send keep-alive messages to listening browsers (seconds).
+KEEPALIVE = 15
+
+
+class server(socketserver.ThreadingMixIn, socketserver.TCPServer):
     allow_reuse_address = True
+    daemon_threads = True
 
 
-def run_server(options, root_dir):
-    """Run web server on specified port."""
+class Reloader:
+    """Tell browsers when the site has been rebuilt."""
+
+    def __init__(self):
+        """Start with no rebuilds."""
+        self.generation = 0
+        self.condition = threading.Condition()
+
+    def notify(self):
+        """Record a rebuild and wake up anyone waiting."""
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait(self, generation, timeout):
+        """Wait for a rebuild after `generation`, returning the current generation."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.generation != generation, timeout)
+            return self.generation
+
+
+def run_server(options, root_dir, reloader=None, preview=None):
+    """Run web server on specified port (rendering pages on demand if previewing)."""
     if not options.run:
         return
 
     class handler(http.server.SimpleHTTPRequestHandler):
+        # Keep connections open so browsers can re-use them for figures.
+        protocol_version = "HTTP/1.1"
+
         def __init__(self, *args, **kwargs):
             super().__init__(*args, directory=root_dir, **kwargs)
 
+        def do_GET(self):
+            if (reloader is not None) and (self.path == RELOAD_PATH):
+                _send_reloads(self, reloader)
+            else:
+                super().do_GET()
+
+        def send_head(self):
+            if preview is not None:
+                return _send_preview(self, preview, reloader)
+            filename = _requested_file(self)
+            if filename is None:
+                return super().send_head()
+            return _send_file(self, filename, reloader)
+
     with server(("", options.run), handler) as httpd:
         LOGGER.info(f"serving port {options.run}")
         httpd.serve_forever()
+
+
+# ----------------------------------------------------------------------
+
+
+class FileRange:
+    """Read part of a file (for byte-range responses)."""
+
+    def __init__(self, filename, start, length):
+        """Open file and move to start of range."""
+        self.reader = open(filename, "rb")
+        self.reader.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        """Read up to `size` bytes without going past the end of the range."""
+        if (size < 0) or (size > self.remaining):
+            size = self.remaining
+        data = self.reader.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        """Close the underlying file."""
+        self.reader.close()
+
+
+def _accepts_gzip(handler, content_type):
+    """Should the response be compressed?"""
+    accepted = handler.headers.get("Accept-Encoding", "")
+    return (
+        ("gzip" in accepted)
+        and ("Range" not in handler.headers)
+        and any(content_type.startswith(t) for t in COMPRESSIBLE)
+    )
+
+
+def _byte_range(handler, etag, size):
+    """Get (start, length) of a single requested byte range, None, or "bad"."""
+    header = handler.headers.get("Range", None)
+    if (header is None) or (size == 0):
+        return None
+    if_range = handler.headers.get("If-Range", None)
+    if (if_range is not None) and (if_range != etag):
+        return None
+
+    match = BYTE_RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.group(1), match.group(2)
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+    if (start >= size) or (end < start):
+        return "bad"
+    return start, end - start + 1
+
+
+def _gzipped(filename, etag, content):
+    """Compress content, re-using the result while the file is unchanged."""
+    cached = GZIPPED.get(filename, None)
+    if (cached is not None) and (cached[0] == etag):
+        return cached[1]
+    if content is None:
+        with open(filename, "rb") as reader:
+            content = reader.read()
+    compressed = gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+    GZIPPED[filename] = (etag, compressed)
+    return compressed
+
+
+def _not_modified(handler, etags, mtime):
+    """Does the client already have the current version?"""
+    if_none_match = handler.headers.get("If-None-Match", None)
+    if if_none_match is not None:
+        requested = {tag.strip() for tag in if_none_match.split(",")}
+        return ("*" in requested) or bool(requested & etags)
+
+    if_modified_since = handler.headers.get("If-Modified-Since", None)
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since.timestamp()
+
+    return False
+
+
+def _requested_file(handler):
+    """Return the path of the file being requested (or None)."""
+    path = handler.translate_path(handler.path)
+    if os.path.isdir(path):
+        if not urlsplit(handler.path).path.endswith("/"):
+            return None
+        path = os.path.join(path, "index.html")
+    if os.path.isfile(path):
+        return path
+    return None
+
+
+def _send_content(handler, key, content, content_type, etag, modified):
+    """Send a whole response body, compressing it if possible."""
+    handler.send_response(200)
+    if _accepts_gzip(handler, content_type):
+        content = _gzipped(key, etag, content)
+        etag = f'{etag[:-1]}-gz"'
+        handler.send_header("Content-Encoding", "gzip")
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(content)))
+    handler.send_header("Vary", "Accept-Encoding")
+    _send_validators(handler, etag, modified)
+    handler.end_headers()
+    return io.BytesIO(content)
+
+
+def _send_file(handler, filename, reloader):
+    """Send headers for a file, returning a readable object for its body (or None)."""
+    stat = os.stat(filename)
+    content_type = handler.guess_type(filename)
+    inject = (reloader is not None) and filename.endswith(".html")
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-r" if inject else ""}"'
+    gzip_etag = f'{etag[:-1]}-gz"'
+    modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+    if _not_modified(handler, {etag, gzip_etag}, stat.st_mtime):
+        handler.send_response(304)
+        _send_validators(handler, etag, modified)
+        handler.end_headers()
+        return None
+
+    content = None
+    if inject:
+        with open(filename, "rb") as reader:
+            content = reader.read()
+        content = content.replace(b"</body>", RELOAD_SCRIPT + b"</body>", 1)
+        content_type = "text/html; charset=utf-8"
+
+    if (content is not None) or _accepts_gzip(handler, content_type):
+        return _send_content(handler, filename, content, content_type, etag, modified)
+
+    selected = _byte_range(handler, etag, stat.st_size)
+    if selected == "bad":
+        handler.send_response(416)
+        handler.send_header("Content-Range", f"bytes */{stat.st_size}")
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+        return None
+
+    if selected is None:
+        handler.send_response(200)
+        start, length = 0, stat.st_size
+    else:
+        start, length = selected
+        handler.send_response(206)
+        handler.send_header(
+            "Content-Range", f"bytes {start}-{start + length - 1}/{stat.st_size}"
+        )
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(length))
+    handler.send_header("Accept-Ranges", "bytes")
+    handler.send_header("Vary", "Accept-Encoding")
+    _send_validators(handler, etag, modified)
+    handler.end_headers()
+    return FileRange(filename, start, length)
+
+
+def _send_preview(handler, preview, reloader):
+    """Send a page rendered from memory or a static file from the source tree."""
+    path = unquote(urlsplit(handler.path).path)
+    if (not path.endswith("/")) and preview.is_page(path + "/"):
+        handler.send_response(301)
+        handler.send_header("Location", urlsplit(handler.path).path + "/")
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+        return None
+
+    rendered = preview.page(path)
+    if rendered is None:
+        filename = preview.static_file(path)
+        if filename is None:
+            handler.send_error(404, "File not found")
+            return None
+        return _send_file(handler, filename, reloader)
+
+    html, mtime = rendered
+    content = html.encode("utf-8")
+    if reloader is not None:
+        content = content.replace(b"</body>", RELOAD_SCRIPT + b"</body>", 1)
+    etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+    modified = email.utils.formatdate(mtime, usegmt=True)
+    if _not_modified(handler, {etag, f'{etag[:-1]}-gz"'}, mtime):
+        handler.send_response(304)
+        _send_validators(handler, etag, modified)
+        handler.end_headers()
+        return None
+    content_type = "text/html; charset=utf-8"
+    return _send_content(handler, path, content, content_type, etag, modified)
+
+
+def _send_reloads(handler, reloader):
+    """Send a server-sent event each time the site is rebuilt."""
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/event-stream")
+    handler.send_header("Cache-Control", "no-cache")
+    handler.end_headers()
+    generation = reloader.generation
+    try:
+        while True:
+            latest = reloader.wait(generation, KEEPALIVE)
+            if latest == generation:
+                handler.wfile.write(b": keepalive\n\n")
+            else:
+                handler.wfile.write(b"data: reload\n\n")
+                generation = latest
+            handler.wfile.flush()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+def _send_validators(handler, etag, modified):
+    """Send headers that let browsers check whether their copy is current."""
+    handler.send_header("ETag", etag)
+    handler.send_header("Last-Modified", modified)
+    handler.send_header("Cache-Control", "no-cache")
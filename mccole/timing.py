@@ -0,0 +1,90 @@
+"""Measure how long each phase of a build takes."""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Peak memory seen so far by each enclosing measurement.
+PEAKS = []
+
+# Whether profiling also measures memory (which slows some phases down several-fold).
+TRACE_MEMORY = True
+
+
+def report_timing(options, config):
+    """Summarize timing and write a trace file if asked to."""
+    if not options.profile:
+        return
+
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    events = sorted(config["profile"], key=lambda e: e["dur"], reverse=True)
+    print(f"{'name':30} {'kind':6} {'ms':>10} {'peak MB':>10}")
+    for event in events:
+        peak = event["args"]["peak_bytes"]
+        peak = "" if peak is None else f"{peak / 2**20:.1f}"
+        ms = event["dur"] / 1000
+        print(f"{event['name']:30} {event['cat']:6} {ms:10.1f} {peak:>10}")
+
+    with open(options.profile, "w") as writer:
+        json.dump({"traceEvents": config["profile"]}, writer, indent=1)
+
+
+def start_timing(options, config):
+    """Start recording timing information if asked to."""
+    if not options.profile:
+        return
+    config["profile"] = []
+    if TRACE_MEMORY:
+        tracemalloc.start()
+
+
+@contextmanager
+def timed(config, name, kind="phase"):
+    """Record wall-clock time and peak memory of a block of code."""
+    if "profile" not in config:
+        yield
+        return
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        _enter_peak()
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter_ns() - start
+        config["profile"].append(
+            {
+                "name": name,
+                "cat": kind,
+                "ph": "X",
+                "ts": start // 1000,
+                "dur": duration // 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {"peak_bytes": _exit_peak() if tracing else None},
+            }
+        )
+
+
+# ----------------------------------------------------------------------
+
+
+def _enter_peak():
+    """Start measuring peak memory for a nested block."""
+    if PEAKS:
+        PEAKS[-1] = max(PEAKS[-1], tracemalloc.get_traced_memory()[1])
+    PEAKS.append(0)
+    tracemalloc.reset_peak()
+
+
+def _exit_peak():
+    """Finish measuring peak memory, passing it on to the enclosing block."""
+    peak = max(PEAKS.pop(), tracemalloc.get_traced_memory()[1])
+    if PEAKS:
+        PEAKS[-1] = max(PEAKS[-1], peak)
+    return peak
@@ -1,36 +1,154 @@
 """Turn chapters into tokens."""
 
-import yaml
+from concurrent.futures import ProcessPoolExecutor
 
-from .util import make_md
+from markdown_it.token import Token
 
+from . import __version__
+from .cache import cache_get, cache_put
+from .links import make_link_refs
+from .util import get_md, hash_data, hash_text, load_yaml, md_fingerprint
 
-def tokenize(config):
-    """Parse each file in turn."""
-    md = make_md()
-    links_table = _make_links_table(config)
-    for info in config["pages"]:
-        with open(info["src"], "r") as reader:
-            text = reader.read()
-            text += links_table
-            info["tokens"] = md.parse(text)
-            info["metadata"] = _get_metadata(info["tokens"])
+# Token fields in the order they are serialized.
+TOKEN_FIELDS = (
+    "type",
+    "tag",
+    "nesting",
+    "attrs",
+    "map",
+    "level",
+    "children",
+    "content",
+    "markup",
+    "info",
+    "meta",
+    "block",
+    "hidden",
+)
+CHILDREN = TOKEN_FIELDS.index("children")
+
+# Parser and link references for worker processes (set by `_init_worker`).
+WORKER_MD = None
+WORKER_REFS = None
+
+
+def tokenize(config, jobs=1, memo=None):
+    """Parse each file (re-using cached or remembered tokens if possible)."""
+    links = config.get("links_data", None)
+    texts = [_read_text(info["src"]) for info in config["pages"]]
+
+    # Cached token streams depend on the text, the links, the parser settings,
+    # and McCole's own plugins (which change with its version).
+    settings = [__version__, hash_data(links), md_fingerprint()]
+    keys = [hash_data([hash_text(text), *settings]) for text in texts]
+    results = [_from_cache(config, key, memo) for key in keys]
+
+    stale = [i for (i, r) in enumerate(results) if r is None]
+    parsed = _parse_all(links, [texts[i] for i in stale], jobs)
+    for (i, (tokens, metadata, used)) in zip(stale, parsed):
+        results[i] = (tokens, metadata, used)
+        rows = tokens_to_rows(tokens)
+        cache_put(config, "tokens", keys[i], (rows, metadata, sorted(used)))
+
+    # Remember only the current pages' tokens for the next call.
+    if memo is not None:
+        memo.clear()
+        memo.update(zip(keys, results))
+
+    # Results are in page order, so numbering is the same as a serial run.
+    for (info, (tokens, metadata, used)) in zip(config["pages"], results):
+        info["tokens"] = tokens
+        info["metadata"] = metadata
+        info["links_used"] = set(used)
+
+
+def rows_to_tokens(rows):
+    """Rebuild tokens from compact serialized form."""
+    result = []
+    for row in rows:
+        token = Token.__new__(Token)
+        for (field, value) in zip(TOKEN_FIELDS, row):
+            setattr(token, field, value)
+        if row[CHILDREN] is not None:
+            token.children = rows_to_tokens(row[CHILDREN])
+        result.append(token)
+    return result
+
+
+def tokens_to_rows(tokens):
+    """Convert tokens to compact serializable form."""
+    return [
+        tuple(
+            tokens_to_rows(token.children)
+            if (field == "children") and (token.children is not None)
+            else getattr(token, field)
+            for field in TOKEN_FIELDS
+        )
+        for token in tokens
+    ]
 
 
 # ----------------------------------------------------------------------
 
 
+def _from_cache(config, key, memo):
+    """Get tokens, metadata, and links used from memory or cache (or None)."""
+    if (memo is not None) and (key in memo):
+        return memo[key]
+    cached = cache_get(config, "tokens", key)
+    if cached is None:
+        return None
+    rows, metadata, used = cached
+    return rows_to_tokens(rows), metadata, used
+
+
 def _get_metadata(tokens):
     """Find and parse metadata (if present)."""
     for token in tokens:
         if token.type == "front_matter":
-            return yaml.safe_load(token.content)
+            return load_yaml(token.content)
     return {}
 
 
-def _make_links_table(config):
-    """Make Markdown links table from configuration."""
-    if "links" not in config:
-        return ""
+def _init_worker(links):
+    """Create a parser and link references once per worker process."""
+    global WORKER_MD, WORKER_REFS
+    WORKER_MD = get_md(directives=True)
+    WORKER_REFS = make_link_refs(WORKER_MD, links)
+
+
+def _parse(md, refs, text):
+    """Parse a single file's text, returning its tokens, metadata, and links used."""
+    env = {"links": refs}
+    tokens = md.parse(text, env)
+    used = env["references"].used if "references" in env else set()
+    return tokens, _get_metadata(tokens), used
+
+
+def _parse_all(links, texts, jobs):
+    """Parse texts, using several processes if asked to."""
+    if not texts:
+        return []
+
+    if (jobs > 1) and (len(texts) > 1):
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(texts)),
+            initializer=_init_worker,
+            initargs=(links,),
+        ) as pool:
+            return list(pool.map(_parse_in_worker, texts))
+
+    md = get_md(directives=True)
+    refs = make_link_refs(md, links)
+    return [_parse(md, refs, text) for text in texts]
+
+
+def _parse_in_worker(text):
+    """Parse a single file's text in a worker process."""
+    return _parse(WORKER_MD, WORKER_REFS, text)
+
 
-    return "\n\n" + "\n".join(f"[{ln['key']}]: {ln['url']}" for ln in config["links"])
+def _read_text(filename):
+    """Read a source file."""
+    with open(filename, "r") as reader:
+        return reader.read()
@@ -1,16 +1,26 @@
 """Utilities."""
 
+import hashlib
 import json
+import os
+import threading
 from types import SimpleNamespace as SN
 
-from markdown_it import MarkdownIt
-from markdown_it.token import Token
-from mdit_py_plugins.deflist import deflist_plugin
-from mdit_py_plugins.front_matter import front_matter_plugin
+# Markdown and YAML libraries are imported by the functions that use them
+# so that commands which don't parse anything (e.g., `--help`) start quickly.
 
 # Identify this module's logger.
 LOGGER_NAME = "mccole"
 
+# Environment variable fixing build time (see https://reproducible-builds.org/).
+SOURCE_DATE_EPOCH = "SOURCE_DATE_EPOCH"
+
+# Shared Markdown parsers for each thread (see `get_md`).
+PARSERS = threading.local()
+
+# Previously-loaded data files: {absolute path: (stamp, data)}.
+DATA_CACHE = {}
+
 
 # ----------------------------------------------------------------------
 
@@ -30,14 +40,92 @@ def err(config, msg):
     config["error_log"].append(msg)
 
 
-def make_md():
-    """Make Markdown parser."""
-    return (
+def file_stamp(filename):
+    """Get modification time and size of a file (or None if it doesn't exist)."""
+    try:
+        stat = os.stat(filename)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def get_md(directives=False):
+    """Get this thread's shared Markdown parser (creating it if necessary)."""
+    if not hasattr(PARSERS, "md"):
+        PARSERS.md = {}
+    if directives not in PARSERS.md:
+        PARSERS.md[directives] = make_md(directives)
+    return PARSERS.md[directives]
+
+
+def hash_data(obj):
+    """Hash JSON-serializable data."""
+    return hash_text(json.dumps(obj, sort_keys=True, default=str))
+
+
+def hash_file(filename):
+    """Hash the contents of a file."""
+    with open(filename, "rb") as reader:
+        return hashlib.sha256(reader.read()).hexdigest()
+
+
+def hash_text(text):
+    """Hash a string."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_cached(filename, loader):
+    """Load a data file, re-using the previous result if the file is unchanged."""
+    stamp = file_stamp(filename)
+    key = os.path.abspath(filename)
+    if (key not in DATA_CACHE) or (DATA_CACHE[key][0] != stamp):
+        DATA_CACHE[key] = (stamp, loader(filename))
+    return DATA_CACHE[key][1]
+
+
+def load_yaml(stream):
+    """Parse YAML safely (and quickly if possible)."""
+    import yaml
+
+    # Use the C YAML loader if it is available.
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(stream, Loader=loader)
+
+
+def make_md(directives=False):
+    """Make Markdown parser (recognizing McCole's directives if asked to)."""
+    from markdown_it import MarkdownIt
+    from mdit_py_plugins.deflist import deflist_plugin
+    from mdit_py_plugins.front_matter import front_matter_plugin
+
+    from .directives import directives_plugin
+    from .links import links_plugin
+
+    md = (
         MarkdownIt("commonmark")
         .enable("table")
         .use(deflist_plugin)
         .use(front_matter_plugin)
     )
+    if directives:
+        md.use(directives_plugin).use(links_plugin)
+    return md
+
+
+def md_fingerprint():
+    """Identify the parser configuration (e.g., for caching token streams)."""
+    import markdown_it
+    import mdit_py_plugins
+
+    md = get_md(directives=True)
+    return hash_data(
+        [
+            markdown_it.__version__,
+            mdit_py_plugins.__version__,
+            dict(md.options),
+            md.get_active_rules(),
+        ]
+    )
 
 
 def obj_to_namespace(obj):
@@ -59,6 +147,8 @@ def pretty(obj):
 
 def _pretty_keys(obj):
     """Replace tuple keys for pretty-printing."""
+    from markdown_it.token import Token
+
     if isinstance(obj, tuple):
         return f"({', '.join(str(x) for x in obj)})"
     elif isinstance(obj, dict):
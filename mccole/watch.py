@@ -0,0 +1,72 @@
+"""Rebuild when inputs change."""
+
+import logging
+import threading
+import time
+from glob import glob
+
+from .server import Reloader, run_server
+from .util import LOGGER_NAME, McColeExc, file_stamp
+
+# How often to check for changes (seconds).
+POLL_INTERVAL = 0.05
+
+# Where to report.
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+def watch(options, config, build):
+    """Rebuild whenever inputs change, telling browsers to reload."""
+    reloader = Reloader()
+    if options.run:
+        threading.Thread(
+            target=run_server, args=(options, config["dst"], reloader), daemon=True
+        ).start()
+
+    print("Watching for changes (Ctrl-C to stop).")
+    stamps = file_stamps(watched_files(options, config))
+    try:
+        while True:
+            time.sleep(POLL_INTERVAL)
+            current = file_stamps(watched_files(options, config))
+            if current == stamps:
+                continue
+
+            changed = ", ".join(_changed(stamps, current))
+            start = time.time()
+            try:
+                config = build(options)
+            except McColeExc as exc:
+                LOGGER.error(f"McCole failed: {exc.msg}")
+            elapsed = int(1000 * (time.time() - start))
+            print(f"Rebuilt after changes to {changed} in {elapsed} ms.")
+            reloader.notify()
+
+            # Files added by the rebuild (e.g., new inclusions) are checked next time.
+            stamps = file_stamps(watched_files(options, config)) | current
+    except KeyboardInterrupt:
+        pass
+
+
+def file_stamps(filenames):
+    """Get stamps for a set of files."""
+    return {f: file_stamp(f) for f in filenames}
+
+
+def watched_files(options, config):
+    """Find all of the files a build depends on."""
+    result = {options.config, *glob("_template/*.html")}
+    result |= {config[key] for key in ("bib", "gloss", "links") if key in config}
+    for info in config["pages"]:
+        result.add(info["src"])
+        if "deps" in info:
+            result |= info["deps"]["files"]
+    return result
+
+
+# ----------------------------------------------------------------------
+
+
+def _changed(old, new):
+    """List files whose stamps differ."""
+    return sorted(f for f in old.keys() | new.keys() if old.get(f) != new.get(f))
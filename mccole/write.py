@@ -1,14 +1,30 @@
 """Write outputs."""
 
+import hashlib
+import json
 import logging
 import os
-from datetime import datetime
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
 from fnmatch import fnmatch
 from glob import glob
 from pathlib import Path
 
+from .cache import merge_cache_stats
 from .render import render
-from .util import LOGGER_NAME, err, obj_to_namespace
+from .timing import timed
+from .util import (
+    LOGGER_NAME,
+    SOURCE_DATE_EPOCH,
+    McColeExc,
+    err,
+    hash_file,
+    obj_to_namespace,
+)
+
+# Where to record which files were copied (relative to output directory).
+COPIED_FILE = os.path.join(".mccole", "copied.json")
 
 # Directory permissions.
 DIR_PERMS = 0o755
@@ -19,59 +35,151 @@ ENCODING = "utf-8"
 # Where to report.
 LOGGER = logging.getLogger(LOGGER_NAME)
 
+# Shared data for worker processes (set by `_init_worker`).
+WORKER_CONFIG = None
+WORKER_XREF = None
+WORKER_SITE = None
 
-# ----------------------------------------------------------------------
+
+def build_date(config):
+    """Get the build date (fixed if SOURCE_DATE_EPOCH is set or asked to)."""
+    if SOURCE_DATE_EPOCH in os.environ:
+        value = os.environ[SOURCE_DATE_EPOCH]
+        try:
+            when = datetime.fromtimestamp(int(value), timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            raise McColeExc(
+                f"{SOURCE_DATE_EPOCH} must be a valid number of seconds, not {value!r}."
+            )
+        return _format_date(when)
+    if not config.get("reproducible", False):
+        return _format_date(datetime.today())
+
+    # Use the newest input so that unchanged sources give unchanged pages.
+    inputs = [info["src"] for info in config["pages"]]
+    inputs += [config[key] for key in ("bib", "gloss", "links") if key in config]
+    inputs += glob("_template/*.html")
+    newest = max(
+        (os.path.getmtime(f) for f in inputs if os.path.isfile(f)), default=None
+    )
+    if newest is None:
+        return _format_date(datetime.today())
+    return _format_date(datetime.fromtimestamp(newest, timezone.utc))
 
 
-def copy_files(config):
-    """Copy static files."""
+def copy_files(config, sync=None, link=False):
+    """Copy static files, skipping unchanged ones if syncing."""
+    pairs = []
     for pattern in config["copy"]:
         filenames = glob(os.path.join(config["src"], pattern))
         filenames = [
             f for f in filenames if not any(fnmatch(f, p) for p in config["exclude"])
         ]
-        filenames = [_pair_src_dst(config, f) for f in filenames]
-        for (src_path, dst_path) in filenames:
-            _copy_file(src_path, dst_path)
+        pairs.extend(_pair_src_dst(config, f) for f in filenames)
+
+    with ThreadPoolExecutor() as pool:
+        outcomes = list(pool.map(lambda p: _sync_file(*p, sync, link), pairs))
+
+    stats = {"copied": outcomes.count("copied"), "skipped": outcomes.count("skipped")}
+    config["copied"] = [dst for (_, dst) in pairs]
+    stats["deleted"] = _sync_copied(config, config["copied"], sync)
+    config["copy_stats"] = stats
+
+
+def generate_pages(config, xref, jobs=1):
+    """Generate output for each chapter, filling in cross-references."""
+    seen = make_seen()
+    site = make_site(config)
+    rendered = _generate_in_parallel(config, xref, site, jobs)
+
+    # Merge in page order so that reports are the same as a serial build.
+    for info in config["pages"]:
+        if info.get("fresh", False):
+            LOGGER.debug(f"Skipping unchanged {info['dst']}.")
+            for msg in info["errors"]:
+                err(config, msg)
+        elif info["slug"] in rendered:
+            info |= rendered[info["slug"]]
+            for msg in info["errors"]:
+                err(config, msg)
+            events = info.pop("profile")
+            if "profile" in config:
+                config["profile"].extend(events)
+            merge_cache_stats(config, info.pop("cache_stats"))
+        else:
+            _generate_page(config, xref, site, info)
+        for key in seen:
+            seen[key] |= info["seen"][key]
+    return seen
 
 
-def generate_pages(config, xref):
-    """Generate output for each chapter in turn, filling in cross-references."""
-    seen = {
+def make_seen():
+    """Make empty record of items referred to."""
+    return {
         "cite": set(),
         "figure_ref": set(),
         "gloss_ref": set(),
         "index_ref": set(),
         "table_ref": set(),
     }
-    site = obj_to_namespace(
+
+
+def make_site(config):
+    """Make the site-wide values that templates refer to."""
+    return obj_to_namespace(
         {
             "title": "McCole",
             "copyrightyear": config["copyrightyear"],
             "author": config["author"],
-            "builddate": datetime.today().strftime("%Y-%m-%d"),
+            "builddate": build_date(config),
             "repo": config["repo"],
             "tool": config["tool"],
         }
     )
-    for info in config["pages"]:
-        html = render(config, xref, seen, info)
-        page = obj_to_namespace({"content": html})
-        page.to_root = info["to_root"]
-        html = _fill_template(config, info, site, page)
-        _write_file(info["dst"], html)
-    return seen
+
+
+def render_page(config, xref, site, info):
+    """Render a single page and fill in its template without writing it."""
+    info["seen"] = make_seen()
+    html = render(config, xref, info["seen"], info)
+    page = obj_to_namespace({"content": html})
+    page.to_root = info["to_root"]
+    return _fill_template(config, info, site, page)
+
+
+def report_copies(options, config):
+    """Report how many files were copied if syncing."""
+    if not options.sync:
+        return
+    stats = config["copy_stats"]
+    print(
+        f"Files: {stats['copied']} copied, {stats['skipped']} skipped, "
+        f"{stats['deleted']} deleted."
+    )
 
 
 # ----------------------------------------------------------------------
 
 
-def _copy_file(src, dst):
-    """Copy a file without modification, making directories as needed."""
+def _copy_file(src, dst, link=False):
+    """Copy or hard-link a file without modification, making directories as needed."""
     LOGGER.debug(f"Copying {dst}.")
     dst = Path(dst)
     dst.parent.mkdir(mode=DIR_PERMS, parents=True, exist_ok=True)
-    dst.write_bytes(Path(src).read_bytes())
+
+    # Never write through an old hard link into the source.
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+
+    if link:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            LOGGER.debug(f"Cannot link {dst}: copying instead.")
+
+    # `copy2` uses zero-copy system calls where available and preserves mtime.
+    shutil.copy2(src, dst)
 
 
 def _fill_template(config, info, site, page):
@@ -88,15 +196,129 @@ def _fill_template(config, info, site, page):
     return template.format(site=site, page=page)
 
 
+def _format_date(when):
+    """Format the build date the way templates show it."""
+    return when.strftime("%Y-%m-%d")
+
+
+def _generate_page(config, xref, site, info):
+    """Render a single page, recording what it refers to and any errors."""
+    num_errors = len(config.get("error_log", []))
+    with timed(config, info["slug"], "page"):
+        html = render_page(config, xref, site, info)
+        info["written"] = _write_file(info["dst"], html)
+    info["errors"] = config.get("error_log", [])[num_errors:]
+
+
+def _generate_in_parallel(config, xref, site, jobs):
+    """Render and write stale pages in worker processes (if asked to)."""
+    pages = [info for info in config["pages"] if not info.get("fresh", False)]
+    if (jobs < 2) or (len(pages) < 2):
+        return {}
+
+    # Workers get a copy of the configuration without every page's tokens,
+    # but with every page (not just stale ones) for tables of contents.
+    shared = config | {
+        "pages": [
+            {k: v for (k, v) in p.items() if k != "tokens"} for p in config["pages"]
+        ],
+        "error_log": [],
+    }
+    if "profile" in config:
+        shared["profile"] = []
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(pages)),
+        initializer=_init_worker,
+        initargs=(shared, xref, site),
+    ) as pool:
+        results = pool.map(_generate_in_worker, pages)
+        return {info["slug"]: result for (info, result) in zip(pages, results)}
+
+
+def _generate_in_worker(info):
+    """Render and write a single page in a worker process."""
+    events = WORKER_CONFIG.get("profile", [])
+    num_events = len(events)
+    WORKER_CONFIG["cache_stats"] = {}
+    _generate_page(WORKER_CONFIG, WORKER_XREF, WORKER_SITE, info)
+    result = {key: info[key] for key in ("deps", "errors", "seen", "written")}
+    result["profile"] = events[num_events:]
+    result["cache_stats"] = WORKER_CONFIG["cache_stats"]
+    return result
+
+
+def _init_worker(config, xref, site):
+    """Save shared read-only data once per worker process."""
+    global WORKER_CONFIG, WORKER_XREF, WORKER_SITE
+    WORKER_CONFIG = config
+    WORKER_XREF = xref
+    WORKER_SITE = site
+
+
 def _pair_src_dst(config, src_file):
     """Construct a pair (src_file, dst_file)."""
     dst_file = os.path.normpath(src_file.replace(config["src"], config["dst"], 1))
     return (src_file, dst_file)
 
 
+def _same_file(src, dst, sync):
+    """Check whether a destination file is already up to date."""
+    try:
+        src_stat = os.stat(src)
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+
+    if os.path.samestat(src_stat, dst_stat):
+        return True
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+        return True
+    if (sync == "hash") and (hash_file(src) == hash_file(dst)):
+        os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        return True
+    return False
+
+
+def _sync_copied(config, copied, sync):
+    """Delete files copied by the last sync whose sources have gone."""
+    if not sync:
+        return 0
+
+    path = Path(config["dst"], COPIED_FILE)
+    previous = json.loads(path.read_text()) if path.is_file() else []
+    path.parent.mkdir(mode=DIR_PERMS, parents=True, exist_ok=True)
+    path.write_text(json.dumps(sorted(copied), indent=1))
+
+    deleted = 0
+    for dst in set(previous) - set(copied):
+        if os.path.isfile(dst):
+            LOGGER.debug(f"Deleting {dst}.")
+            os.unlink(dst)
+            deleted += 1
+    return deleted
+
+
+def _sync_file(src, dst, sync, link):
+    """Copy a single file unless syncing and it is already up to date."""
+    if sync and _same_file(src, dst, sync):
+        LOGGER.debug(f"Skipping unchanged {dst}.")
+        return "skipped"
+    _copy_file(src, dst, link)
+    return "copied"
+
+
 def _write_file(dst, html):
-    """Write a file, making directories if needed."""
-    LOGGER.debug(f"Writing {dst}.")
+    """Write a file if its contents have changed, making directories if needed."""
+    data = html.encode(ENCODING)
     dst = Path(dst)
+    if dst.is_file() and (dst.stat().st_size == len(data)):
+        if hash_file(dst) == hashlib.sha256(data).hexdigest():
+            LOGGER.debug(f"Leaving unchanged {dst}.")
+            return False
+
+    LOGGER.debug(f"Writing {dst}.")
     dst.parent.mkdir(mode=DIR_PERMS, parents=True, exist_ok=True)
-    dst.write_text(html, encoding=ENCODING)
+    dst.write_bytes(data)
+    return True